@@ -2,6 +2,8 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
+from metrics import collect_libraries
+
 
 COLOR_MAP_NAME = 'Purples'
 COLOR_MAP_VMIN = 0
@@ -12,18 +14,21 @@ FONT_WEIGHT = 'bold'
 
 
 class ChartData:
-    def __init__(self, file: str):
+    def __init__(self, df: pd.DataFrame, title: str):
         self.types = None
         self.complexities = None
         self.shape = None
-        self.title = None
-        self._fill_up(file)
-        self._title_by_name(file)
+        self.title = title
+        self._fill_up(df)
 
-    def _fill_up(self, file):
+    @classmethod
+    def from_file(cls, file: str):
         df = pd.read_table(file, sep='|', header=0, skiprows=[1], usecols=[3, 5])
         df.rename(columns=str.strip, inplace=True)
-        df.sort_values(by=['Type'], inplace=True)
+        return cls(df, cls._title_by_name(file))
+
+    def _fill_up(self, df):
+        df = df.sort_values(by=['Type'])
         self.types, self.complexities = df['Type'].values, df['Complexity'].values
         self._convert()
 
@@ -41,17 +46,22 @@ class ChartData:
                                             (self.types, self.complexities))
         self.shape = self.complexities.shape
 
-    def _title_by_name(self, file):
+    @staticmethod
+    def _title_by_name(file):
         if file.startswith('sqlitedict'):
-            self.title = 'Sqlitedict'
+            return 'Sqlitedict'
         elif file.startswith('tiny'):
-            self.title = 'TinyDB'
-        elif file.startswith('kv'):
-            self.title = 'Peewee KV'
+            return 'TinyDB'
+        elif file.startswith('peewee-kv'):
+            return 'Peewee KV'
 
 
 def main():
-    chart_datas = map(ChartData, ('tinydb/cc.md', 'sqlitedict/cc.md', 'peewee-kv/cc.md'))
+    libraries_metrics = collect_libraries()  # the tables collected for the article otherwise
+    if libraries_metrics:
+        chart_datas = [ChartData(metrics.complexity, title) for title, metrics in libraries_metrics.items()]
+    else:
+        chart_datas = map(ChartData.from_file, ('tinydb/cc.md', 'sqlitedict/cc.md', 'peewee-kv/cc.md'))
     fig, axes = plt.subplots(nrows=3, ncols=1)
 
     for ax, chart_data in zip(axes, chart_datas):
@@ -0,0 +1,117 @@
+import shelve
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from importlib.util import find_spec
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import pandas as pd
+import radon
+from radon.complexity import cc_visit, cc_rank
+from radon.metrics import h_visit
+
+
+CACHE_FILE = Path.home() / '.cache' / 'code-metrics'
+WORKERS = None  # cpu count
+LIBRARIES = {'TinyDB': 'tinydb', 'Sqlitedict': 'sqlitedict', 'Peewee KV': 'playhouse.kv'}  # title: module
+HALSTEAD_FIELDS = ('h1', 'h2', 'N1', 'N2', 'vocabulary', 'length', 'calculated_length',
+                   'volume', 'difficulty', 'effort', 'time', 'bugs')
+
+
+@dataclass
+class Metrics:
+    complexity: pd.DataFrame  # a row per function, method and class, like `radon cc`
+    halstead: pd.DataFrame  # a row per file, like `radon hal`
+
+    def summary(self) -> Dict[str, int]:
+        """Values of the radar chart which can be computed from the sources"""
+        summary = {field: int(self.halstead[field].sum()) for field in ('N1', 'N2', 'h1', 'h2')}
+        summary['Classes count'] = int((self.complexity['Type'] == 'C').sum())
+        summary['CC targets count'] = len(self.complexity)
+        summary['CC max complexity'] = int(self.complexity['Complexity'].max())
+        return summary
+
+
+def find_source(module_name: str) -> Optional[Path]:
+    """A package dir or a module file of an installed library"""
+    try:
+        spec = find_spec(module_name)
+    except ModuleNotFoundError:
+        return None
+    if spec is None or spec.origin is None:
+        return None
+
+    origin = Path(spec.origin)
+    return origin.parent if spec.submodule_search_locations else origin
+
+
+def analyze(code: str) -> Tuple[List[tuple], tuple]:
+    """Complexity of the functions, classes and methods, and the file total of Halstead metrics"""
+    complexity = [(block.fullname, block.letter, f'{block.lineno}:{block.endline}',
+                   block.complexity, cc_rank(block.complexity)) for block in cc_visit(code)]
+    return complexity, tuple(h_visit(code).total)
+
+
+def collect(source: Path, workers: int = WORKERS, used_keys: Optional[Set[str]] = None) -> Metrics:
+    """Files are analyzed in parallel, results are cached by a file content hash.
+    The cache keys of the files are added to `used_keys`, the rest are dropped by `prune_cache`."""
+    files = sorted(source.rglob('*.py')) if source.is_dir() else [source]
+    codes = {file: file.read_text() for file in files}
+    keys = {file: f'{radon.__version__}:{hashlib.sha1(code.encode()).hexdigest()}' for file, code in codes.items()}
+    if used_keys is not None:
+        used_keys.update(keys.values())
+    results = {}
+
+    CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with shelve.open(CACHE_FILE.as_posix()) as cache:
+        missed = []
+        for file, key in keys.items():
+            if key in cache:
+                results[file] = cache[key]
+            else:
+                missed.append(file)
+
+        if missed:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for file, result in zip(missed, executor.map(analyze, [codes[file] for file in missed])):
+                    cache[keys[file]] = results[file] = result
+
+    root = source.parent
+    complexity_rows, halstead_rows = [], []
+    for file in files:
+        complexity, halstead = results[file]
+        filename = file.relative_to(root).as_posix()
+        complexity_rows.extend((filename, *row) for row in complexity)
+        halstead_rows.append((filename, *halstead))
+
+    complexity = pd.DataFrame(complexity_rows, columns=['Filename', 'Name', 'Type', 'Start:End Line',
+                                                        'Complexity', 'Clasification'])
+    halstead = pd.DataFrame(halstead_rows, columns=('Filename',) + HALSTEAD_FIELDS).set_index('Filename')
+    return Metrics(complexity=complexity.sort_values(by=['Complexity'], ascending=False, kind='stable'),
+                   halstead=halstead)
+
+
+def prune_cache(used_keys: Set[str]):
+    """Drop the results of the changed and removed files, and of the other radon versions"""
+    with shelve.open(CACHE_FILE.as_posix()) as cache:
+        for key in set(cache) - used_keys:
+            del cache[key]
+
+
+def collect_libraries() -> Dict[str, Metrics]:
+    """Metrics of the installed libraries, an empty mapping if any is missing.
+    The cache keeps the files of all the libraries."""
+    sources = {title: find_source(module_name) for title, module_name in LIBRARIES.items()}
+    if not all(sources.values()):
+        return {}
+
+    used_keys = set()
+    libraries_metrics = {title: collect(source, used_keys=used_keys) for title, source in sources.items()}
+    prune_cache(used_keys)
+    return libraries_metrics
+
+
+if __name__ == '__main__':
+    for title, metrics in collect_libraries().items():
+        print(title, metrics.summary())
@@ -3,8 +3,16 @@ import plotly.graph_objects as go
 import plotly.offline as pyo
 from plotly.subplots import make_subplots
 
+from metrics import collect_libraries
+
 
 PEEWEE_KV_COEF = Decimal(10)
+TITLES = ('Sqlitedict', 'Peewee KV', 'TinyDB')
+CATEGORIES = ('N1', 'N2', 'h1', 'h2', 'Dependencies', 'Classes count', 'Graph calls',
+              'CC targets count', 'CC max complexity')
+MANUAL_METRICS = {'Sqlitedict': {'Dependencies': 0, 'Graph calls': 19},  # from the dependency and call graphs
+                  'Peewee KV': {'Dependencies': 2, 'Graph calls': 20},
+                  'TinyDB': {'Dependencies': 7, 'Graph calls': 12}}
 data = [(('N1', Decimal('63')),
          ('N2', Decimal('121')),
          ('h1', Decimal('12')),
@@ -32,7 +40,12 @@ data = [(('N1', Decimal('63')),
          ('Graph calls', Decimal('12')),
          ('CC targets count', Decimal('121')),
          ('CC max complexity', Decimal('6')))
-        ]
+        ]  # collected by hand for the article
+if libraries_metrics := collect_libraries():
+    data = []
+    for title in TITLES:
+        values = {**libraries_metrics[title].summary(), **MANUAL_METRICS[title]}
+        data.append(tuple((category, Decimal(values[category])) for category in CATEGORIES))
 fig = make_subplots(rows=2, cols=1, specs=[[{"type": "polar"}],
                                            [{"type": "polar"}]])
 
@@ -0,0 +1,77 @@
+import json
+import sqlite3
+import platform
+import statistics
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, List
+
+import duckdb
+import typer
+import numpy as np
+
+from database import RandomDB
+
+
+app = typer.Typer()
+
+QUERY_FILE = Path('query.sql')
+RESULTS_FILE = Path('results.json')
+PERCENTILES = (90, 99)
+
+
+def measure(execute: Callable, query: str, warmups: int, repeats: int) -> List[float]:
+    """Seconds of every repetition, a result is fetched to include its materialization."""
+    for _ in range(warmups):
+        execute(query).fetchall()
+
+    timings = []
+    for _ in range(repeats):
+        start = perf_counter()
+        execute(query).fetchall()
+        timings.append(perf_counter() - start)
+
+    return timings
+
+
+def summarize(timings: List[float]) -> dict:
+    summary = {'min': min(timings), 'median': statistics.median(timings), 'max': max(timings)}
+    for percentile in PERCENTILES:
+        summary[f'p{percentile}'] = float(np.percentile(timings, percentile))
+    return summary
+
+
+@app.command()
+def run(tables_count: int = 10, warmups: int = 2, repeats: int = 10, threads: List[int] = (1, 4),
+        results_file: Path = RESULTS_FILE):
+    """Run the query in-process over the tables made by `split_duckdb`/`split_sqlite`."""
+    db = RandomDB()
+    query_template = QUERY_FILE.read_text()
+    results = []
+
+    for i in range(1, tables_count + 1):
+        table_name = db.base_table_name + f'{i}'
+        query = query_template.replace(f'from {db.base_table_name}', f'from {table_name}')
+        rows = db.connection.execute(f'SELECT count(*) FROM {table_name}').fetchone()[0]
+
+        for threads_count in threads:
+            db.connection.execute(f'SET threads TO {threads_count}')
+            timings = measure(db.connection.execute, query, warmups, repeats)
+            results.append({'engine': 'duckdb', 'threads': threads_count, 'table': table_name, 'rows': rows,
+                            'timings': timings, **summarize(timings)})
+            print(f'DuckDB {table_name}, threads {threads_count}: {results[-1]["median"]:.3f}s')
+
+        timings = measure(db.sqlite_connection.execute, query, warmups, repeats)
+        results.append({'engine': 'sqlite', 'threads': 1, 'table': table_name, 'rows': rows,
+                        'timings': timings, **summarize(timings)})
+        print(f'Sqlite {table_name}: {results[-1]["median"]:.3f}s')
+
+    machine = {'platform': platform.platform(), 'processor': platform.processor(), 'python': platform.python_version(),
+               'duckdb': duckdb.__version__, 'sqlite': sqlite3.sqlite_version}
+    settings = {'warmups': warmups, 'repeats': repeats, 'threads': list(threads)}
+    results_file.write_text(json.dumps({'machine': machine, 'settings': settings, 'results': results}, indent=1))
+    print(f'Results are written to {results_file}')
+
+
+if __name__ == '__main__':
+    app()
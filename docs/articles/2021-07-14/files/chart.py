@@ -1,17 +1,46 @@
+import json
+from collections import defaultdict
+from pathlib import Path
+
 import plotly.graph_objects as go
 
 from convertation import sqlite_output, duck_output, convert
 
 
+RESULTS_FILE = Path('results.json')  # written by `benchmark.py`, importing it would load duckdb and numpy
+
+
+def load_series() -> dict:
+    """Medians per engine from the benchmark results, the article's original measurements otherwise"""
+    if not RESULTS_FILE.exists():
+        return {'DuckDB': (convert(duck_output), None), 'Sqlite': (convert(sqlite_output), None)}
+
+    results = json.loads(RESULTS_FILE.read_text())['results']
+    engine_threads = defaultdict(set)
+    for result in results:
+        engine_threads[result['engine']].add(result['threads'])
+
+    series = defaultdict(lambda: ([], {'type': 'data', 'symmetric': False, 'array': [], 'arrayminus': []}))
+    for result in results:  # ordered by the tables size
+        name = 'DuckDB' if result['engine'] == 'duckdb' else 'Sqlite'
+        if len(engine_threads[result['engine']]) > 1:
+            name += f', {result["threads"]} threads'
+        medians, error = series[name]
+        medians.append(result['median'])
+        error['array'].append(result['p90'] - result['median'])
+        error['arrayminus'].append(result['median'] - result['min'])
+
+    return dict(series)
+
+
 def build():
     """Making a lines plot with time measurement data"""
-    sqlite_data = convert(sqlite_output)
-    duckdb_data = convert(duck_output)
+    series = load_series()
 
     fig = go.Figure()
-    x_coord_names = [f'{i}M' for i in range(1, len(sqlite_data)+1)]
-    fig.add_trace(go.Scatter(x=x_coord_names, y=duckdb_data, mode='lines+markers', name='DuckDB'))
-    fig.add_trace(go.Scatter(x=x_coord_names, y=sqlite_data, mode='lines+markers', name='Sqlite'))
+    for name, (seconds, error) in series.items():
+        x_coord_names = [f'{i}M' for i in range(1, len(seconds)+1)]
+        fig.add_trace(go.Scatter(x=x_coord_names, y=seconds, error_y=error, mode='lines+markers', name=name))
     fig.update_layout(
         title=dict(
             text='Query execution performance. Lower is better.',
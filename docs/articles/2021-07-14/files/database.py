@@ -1,8 +1,12 @@
+import sqlite3
 import duckdb
 import typer
 import subprocess
+import numpy as np
+import pyarrow as pa
 
-from random import randint
+from concurrent.futures import ProcessPoolExecutor
+from functools import cached_property
 
 
 app = typer.Typer()
@@ -25,6 +29,9 @@ class RandomDB:
         value3 INTEGER);  
         '''
     LIMIT_GRADE = 1_000_000
+    COLUMNS = ('grp', 'value1', 'value2', 'value3')
+    GROUP_MAX = 256
+    VALUE_MAX = 4294967295
 
     def __init__(self):
         self.duckdb_name = 'random.duckdb'
@@ -32,29 +39,56 @@ class RandomDB:
         self.base_table_name = 'random_data'
         self.connection = duckdb.connect(database=self.duckdb_name)
 
-    def fill_duckdb(self, sample_size: int = 2000, samples_count: int = 2000):
-        """Create the base table and fill it up with random data."""
+    @cached_property
+    def sqlite_connection(self) -> sqlite3.Connection:
+        """Opened by the sqlite commands only, a DuckDB run doesn't create the sqlite file"""
+        return sqlite3.connect(self.sqlite_name)
+
+    @classmethod
+    def generate_sample(cls, sample_size: int, seed_sequence: np.random.SeedSequence) -> pa.Table:
+        """Columns of random unsigned integers, the same seed sequence gives the same sample."""
+        rng = np.random.default_rng(seed_sequence)
+        columns = [rng.integers(0, cls.GROUP_MAX, size=sample_size, dtype=np.uint32, endpoint=True)]
+        columns += [rng.integers(0, cls.VALUE_MAX, size=sample_size, dtype=np.uint32, endpoint=True)
+                    for _ in cls.COLUMNS[1:]]
+        return pa.table(dict(zip(cls.COLUMNS, columns)))  # arrow arrays share the numpy buffers
+
+    def generate_samples(self, sample_size: int, samples_count: int, seed: int = None, processes: int = 1):
+        """Samples in order, every sample has its own seed spawned from the main one,
+        so the data doesn't depend on a processes count."""
+        seed_sequences = np.random.SeedSequence(seed).spawn(samples_count)
+        if processes == 1:
+            yield from (self.generate_sample(sample_size, seed_sequence) for seed_sequence in seed_sequences)
+            return
+
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            yield from executor.map(self.generate_sample, [sample_size] * samples_count, seed_sequences)
+
+    def fill_duckdb(self, sample_size: int = 2000, samples_count: int = 2000, seed: int = None, processes: int = 1):
+        """Create the base table and fill it up with random data. Set the seed to get a reproducible data."""
         self.connection.execute(self.CREATE_TABLE_DUCKDB.format(table_name=self.base_table_name))
 
-        group_min = 0
-        group_max = 256
-        value_min = 0
-        value_max = 4294967295
-
-        for i in range(samples_count):
-            values_exp = 'VALUES '
-            for j in range(sample_size):
-                values_exp += '({},{},{},{}), '.format(randint(group_min, group_max),
-                                                       randint(value_min, value_max),
-                                                       randint(value_min, value_max),
-                                                       randint(value_min, value_max))
-            values_exp = values_exp.rstrip().rstrip(',')
-            self.connection.execute(f"INSERT INTO {self.base_table_name} {values_exp}")
+        for i, sample in enumerate(self.generate_samples(sample_size, samples_count, seed, processes)):
+            self.connection.register('sample', sample)  # scanned in place, no SQL values are built
+            self.connection.execute(f"INSERT INTO {self.base_table_name} SELECT * FROM sample")
+            self.connection.unregister('sample')
             print(f'Sample {i} is filled up')
         print(f'Database {self.duckdb_name} is filled up')
 
-    def fill_sqlite(self, csv_path: str):
-        """Create the base table and fill it up with random data."""
+    def fill_sqlite(self, sample_size: int = 2000, samples_count: int = 2000, seed: int = None, processes: int = 1):
+        """Create the base table and fill it up with random data. The same seed as for DuckDB gives the same data."""
+        self.sqlite_connection.execute(self.CREATE_TABLE_SQLITE.format(table_name=self.base_table_name))
+
+        insert_query = f'INSERT INTO {self.base_table_name} VALUES (?, ?, ?, ?)'
+        with self.sqlite_connection:  # a single transaction
+            for i, sample in enumerate(self.generate_samples(sample_size, samples_count, seed, processes)):
+                columns = (sample.column(name).to_numpy().tolist() for name in self.COLUMNS)
+                self.sqlite_connection.executemany(insert_query, zip(*columns))
+                print(f'Sample {i} is filled up')
+        print(f'Database {self.sqlite_name} is filled up')
+
+    def import_sqlite(self, csv_path: str):
+        """Create the base table and fill it up with data of a csv file."""
         create_query = self.CREATE_TABLE_SQLITE.format(table_name=self.base_table_name)
         import_cmd = f'.import {csv_path} {self.base_table_name}'
         subprocess.run(['sqlite3', self.sqlite_name, '-cmd', create_query, '.mode csv', import_cmd])
@@ -78,26 +112,32 @@ class RandomDB:
         """Split the base table onto smaller tables."""
         for i in range(1, tables_count + 1):
             table_name = self.base_table_name + f'{i}'
-            self.connection.execute(self.CREATE_TABLE_SQLITE.format(table_name=table_name))
+            self.sqlite_connection.execute(self.CREATE_TABLE_SQLITE.format(table_name=table_name))
             print('Table created: ', table_name)
 
         limit = self.LIMIT_GRADE
-        for i in range(1, tables_count + 1):
-            table_name = self.base_table_name + f'{i}'
-            print('Table filling:  ', table_name)
-            self.connection.execute(f'INSERT INTO {table_name} SELECT * FROM {self.base_table_name} LIMIT {limit}')
-            limit += self.LIMIT_GRADE
+        with self.sqlite_connection:
+            for i in range(1, tables_count + 1):
+                table_name = self.base_table_name + f'{i}'
+                print('Table filling:  ', table_name)
+                self.sqlite_connection.execute(f'INSERT INTO {table_name} SELECT * FROM {self.base_table_name} LIMIT {limit}')
+                limit += self.LIMIT_GRADE
 
     def dump_csv(self, path='.'):
         """Dump data from the base table to csv file in a specified directory directory."""
         self.connection.execute(f"EXPORT DATABASE '{path}' (FORMAT CSV, HEADER TRUE);")
 
 
-if __name__ == '__main__':
+def main():
     db = RandomDB()
     app.command()(db.fill_duckdb)
     app.command()(db.fill_sqlite)
+    app.command()(db.import_sqlite)
     app.command()(db.split_duckdb)
     app.command()(db.split_sqlite)
     app.command()(db.dump_csv)
-    app()
\ No newline at end of file
+    app()
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
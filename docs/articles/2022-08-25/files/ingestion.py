@@ -0,0 +1,79 @@
+"""Timing lines of the snapshot benchmarks, `/usr/bin/time -f 'execution time: %E'`, into a DuckDB results store.
+A log is parsed once, until its content changes."""
+import re
+import hashlib
+from array import array
+from pathlib import Path
+from typing import Iterator
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+
+STORE_FILE = Path('results.duckdb')
+# %E is [hours:]minutes:seconds, the seconds have a fraction
+TIME_RE = re.compile(r'^\s*execution time:\s*(?:(?P<hours>\d+):)?(?P<minutes>\d+):(?P<seconds>\d+(?:\.\d+)?)\s*$')
+CREATE_TABLES = '''
+    CREATE TABLE IF NOT EXISTS sources(system VARCHAR PRIMARY KEY, path VARCHAR, hash VARCHAR);
+    CREATE TABLE IF NOT EXISTS runs(system VARCHAR, run UINTEGER, seconds DOUBLE);
+    '''
+
+
+def parse_seconds(lines) -> Iterator[float]:
+    """Stream the durations, lines of the other commands are skipped"""
+    for line in lines:
+        if match := TIME_RE.match(line):
+            hours, minutes, seconds = match.group('hours', 'minutes', 'seconds')
+            yield int(hours or 0) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def file_hash(path: Path) -> str:
+    digest = hashlib.sha1()
+    with path.open('rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def connect(store_file: Path = STORE_FILE) -> duckdb.DuckDBPyConnection:
+    connection = duckdb.connect(str(store_file))
+    connection.execute(CREATE_TABLES)
+    return connection
+
+
+def ingest(connection, system: str, path: Path) -> int:
+    """Replace the runs of a system if its log is changed, a count of the parsed runs is returned"""
+    content_hash = file_hash(path)
+    stored = connection.execute('SELECT hash FROM sources WHERE system = ?', [system]).fetchone()
+    if stored and stored[0] == content_hash:
+        return 0
+
+    with path.open() as lines:
+        seconds = np.frombuffer(array('d', parse_seconds(lines)), dtype=np.float64)
+    runs = pd.DataFrame({'system': system, 'run': np.arange(1, len(seconds) + 1, dtype=np.uint32), 'seconds': seconds})
+
+    connection.begin()
+    connection.execute('DELETE FROM runs WHERE system = ?', [system])
+    connection.register('runs_df', runs)
+    connection.execute('INSERT INTO runs SELECT system, run, seconds FROM runs_df')
+    connection.unregister('runs_df')
+    connection.execute('INSERT OR REPLACE INTO sources VALUES (?, ?, ?)', [system, str(path), content_hash])
+    connection.commit()
+    return len(runs)
+
+
+def cumulative(connection) -> pd.DataFrame:
+    """Running total of the durations per system, the runs are rows, the systems are columns"""
+    df = connection.execute('''
+        SELECT system, run, sum(seconds) OVER (PARTITION BY system ORDER BY run) AS cumulative
+        FROM runs''').df()
+    return df.pivot(index='run', columns='system', values='cumulative')
+
+
+def summary(connection) -> pd.DataFrame:
+    """Per-run aggregates of every system"""
+    return connection.execute('''
+        SELECT system, count(*) AS runs, sum(seconds) AS total, avg(seconds) AS mean,
+               median(seconds) AS median, quantile_cont(seconds, 0.95) AS p95, max(seconds) AS max
+        FROM runs GROUP BY system ORDER BY system''').df().set_index('system')
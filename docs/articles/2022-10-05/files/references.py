@@ -1,16 +1,21 @@
 import sys
+import shelve
+import hashlib
+import time
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field
 from functools import partial, lru_cache
-from typing import List, Tuple
+from typing import List
 from enum import Enum
-from statistics import median
 
 import toml
+import numpy as np
 import networkx
 import typer
 import matplotlib.pyplot as plt
 from matplotlib import font_manager
+from matplotlib.colors import to_rgba_array
 from structlog import get_logger, configure, make_filtering_bound_logger
 from structlog.contextvars import merge_contextvars
 from structlog.dev import ConsoleRenderer, _use_colors, set_exc_info
@@ -25,6 +30,14 @@ TOML_COLOR = 'tab:purple'
 ERROR_COLOR = 'tab:red'
 FILE_COLOR = 'tab:cyan'
 EDGE_COLOR = 'tab:blue'
+SCAN_CACHE_FILE = Path.home() / '.cache' / 'references-scan'
+SCAN_WORKERS = None  # cpu count
+SCAN_CHUNK_SIZE = 64
+LAYOUT_CACHE_FILE = Path.home() / '.cache' / 'references-layouts'
+LAYOUT_CACHE_SIZE = 64  # graphs and layouts, the least recently used are dropped
+FORCE_ITERATIONS = 50
+FORCE_GRID_SIZE = 16  # cells per side, repulsion is computed against the cells mass centres
+FORCE_CHUNK_SIZE = 4096  # nodes per a vectorized repulsion step
 font_files = font_manager.findSystemFonts(fontpaths=['/usr/local/share/fonts/r'])
 for font_file in font_files:
     font_manager.fontManager.addfont(font_file)
@@ -66,11 +79,12 @@ class Node:
 @dataclass
 class TomlNode(Node):
     """Container of toml file type"""
-    data: dict = field(repr=False, init=False)  # parsed toml config
+    data: dict = field(repr=False, default=None)  # parsed toml config
 
     def __post_init__(self):
         super(TomlNode, self).__post_init__()
-        self.data = toml.load(self.path)
+        if self.data is None:
+            self.data = toml.load(self.path)
 
 
 @dataclass
@@ -139,7 +153,7 @@ class TomlNodeReferences:
             yield ref_node
 
 
-def node_fabric(str_or_path, color=None, reference=False, source_dir: Path = None):
+def node_fabric(str_or_path, color=None, reference=False, source_dir: Path = None, data: dict = None):
     """Cover all the cases of node creation"""
     path = Path(str_or_path)
     attrs = NodeAttr()
@@ -150,7 +164,7 @@ def node_fabric(str_or_path, color=None, reference=False, source_dir: Path = Non
         abs_path = source_dir.joinpath(str_or_path).resolve()
         node = RefNode(path=abs_path, raw_ref=str_or_path, attrs=attrs)
     elif path.suffix == '.toml':
-        node = TomlNode(path=path, attrs=attrs)
+        node = TomlNode(path=path, attrs=attrs, data=data)
     else:
         attrs.color = FILE_COLOR
         node = Node(path=path, attrs=attrs)
@@ -158,24 +172,50 @@ def node_fabric(str_or_path, color=None, reference=False, source_dir: Path = Non
     return node
 
 
-def nodes_from_files(source_dir: Path):
-    """Scan folders and create nodes"""
+def _parse_toml(path: Path) -> dict:
+    return toml.load(path)
 
-    # @lru_cache(maxsize=None)
-    def _cached(path):
-        if not path.is_absolute():  # `Folder/path | ~/Folder/path`
-            path = path.expanduser().resolve()
 
-        for file in path.rglob('*'):
-            if file.is_dir():
-                continue
+def scan(source_dir: Path) -> List[Node]:
+    """Walk a folder once, parse the toml files in a process pool.
+    Parsed data is cached on disk by a file path, mtime and size, the removed files of the folder are dropped."""
+
+    if not source_dir.is_absolute():  # `Folder/path | ~/Folder/path`
+        source_dir = source_dir.expanduser().resolve()
+
+    files = [file for file in source_dir.rglob('*') if not file.is_dir()]
+    toml_stats = {file: file.stat() for file in files if file.suffix == '.toml'}
+    toml_data = {}
 
-            node = node_fabric(file)
+    SCAN_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with shelve.open(SCAN_CACHE_FILE.as_posix()) as cache:
+        missed = []
+        for file, stat in toml_stats.items():
+            mtime, size, data = cache.get(file.as_posix(), (None, None, None))
+            if (mtime, size) == (stat.st_mtime_ns, stat.st_size):
+                toml_data[file] = data
+            else:
+                missed.append(file)
 
-            yield node
+        if missed:
+            with ProcessPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+                for file, data in zip(missed, executor.map(_parse_toml, missed, chunksize=SCAN_CHUNK_SIZE)):
+                    stat = toml_stats[file]
+                    cache[file.as_posix()] = (stat.st_mtime_ns, stat.st_size, data)
+                    toml_data[file] = data
 
-    # logger.debug('Cache stats.', func=_cached, stats=_cached.cache_info())
-    yield from _cached(source_dir)
+        scanned_keys = {file.as_posix() for file in toml_stats}  # removed and renamed files of this folder
+        stale_keys = [key for key in cache if Path(key).is_relative_to(source_dir) and key not in scanned_keys]
+        for key in stale_keys:
+            del cache[key]
+
+    logger.debug('Scan cache stats.', files=len(files), toml_files=len(toml_stats), parsed=len(missed))
+    return [node_fabric(file, data=toml_data.get(file)) for file in files]
+
+
+def nodes_from_files(source_dir: Path):
+    """Scan folders and create nodes"""
+    yield from scan(source_dir)
 
 
 def create_graph(nodes, add_edges=True):
@@ -194,11 +234,110 @@ def create_graph(nodes, add_edges=True):
     return g
 
 
-@cli.command()
-def check(path: Path):
-    """Ensure all the checks are passed"""
-
-    nodes = nodes_from_files(path)
+def _repulsion(pos, centres, masses, k):
+    """Fruchterman-Reingold repulsion `k^2 / d` of every node from every grid cell"""
+    displacement = np.zeros_like(pos)
+    for start in range(0, len(pos), FORCE_CHUNK_SIZE):
+        delta = pos[start:start + FORCE_CHUNK_SIZE, None, :] - centres[None, :, :]
+        distance2 = np.maximum((delta ** 2).sum(axis=-1), 1e-9)
+        displacement[start:start + FORCE_CHUNK_SIZE] = (delta * (k ** 2 * masses / distance2)[..., None]).sum(axis=1)
+    return displacement
+
+
+def force_layout(graph, iterations=FORCE_ITERATIONS, grid_size=FORCE_GRID_SIZE, seed=None) -> dict:
+    """Force-directed layout for large graphs. Like in Barnes-Hut, the far nodes repulse as a mass centre
+    of their grid cell, so an iteration costs O(nodes * cells) instead of O(nodes^2)"""
+
+    nodes = list(graph)
+    if not nodes:
+        return {}
+
+    index = {graph_id: i for i, graph_id in enumerate(nodes)}
+    edges = np.array([(index[u], index[v]) for u, v in graph.edges() if u != v], dtype=np.intp).reshape(-1, 2)
+    pos = np.random.default_rng(seed).random((len(nodes), 2))
+    k = 1 / np.sqrt(len(nodes))  # optimal distance between nodes
+    temperature = 0.1
+    cooling = temperature / (iterations + 1)
+
+    for _ in range(iterations):
+        cells = ((pos - pos.min(axis=0)) / (np.ptp(pos, axis=0) + 1e-9) * grid_size).astype(np.intp)
+        cells = np.minimum(cells, grid_size - 1)
+        _, inverse, masses = np.unique(cells[:, 0] * grid_size + cells[:, 1],
+                                       return_inverse=True, return_counts=True)
+        inverse = inverse.ravel()
+        sums = np.zeros((len(masses), 2))
+        np.add.at(sums, inverse, pos)
+        centres = sums / masses[:, None]
+
+        displacement = _repulsion(pos, centres, masses, k)
+
+        # the own cell is replaced by its mass centre without the node itself
+        own_delta = pos - centres[inverse]
+        own_distance2 = np.maximum((own_delta ** 2).sum(axis=1), 1e-9)
+        displacement -= own_delta * (k ** 2 * masses[inverse] / own_distance2)[:, None]
+        own_masses = masses[inverse] - 1
+        has_neighbours = own_masses > 0
+        own_centres = np.where(has_neighbours[:, None],
+                               (sums[inverse] - pos) / np.maximum(own_masses, 1)[:, None], pos)
+        own_delta = pos - own_centres
+        own_distance2 = np.maximum((own_delta ** 2).sum(axis=1), 1e-9)
+        displacement += own_delta * (k ** 2 * own_masses * has_neighbours / own_distance2)[:, None]
+
+        if len(edges):  # attraction `d^2 / k` along the edges
+            delta = pos[edges[:, 0]] - pos[edges[:, 1]]
+            attraction = delta * (np.sqrt((delta ** 2).sum(axis=1)) / k)[:, None]
+            np.add.at(displacement, edges[:, 0], -attraction)
+            np.add.at(displacement, edges[:, 1], attraction)
+
+        length = np.maximum(np.sqrt((displacement ** 2).sum(axis=1)), 1e-9)
+        pos += displacement * (np.minimum(length, temperature) / length)[:, None]
+        temperature -= cooling
+
+    return dict(zip(nodes, pos))
+
+
+LAYOUTS = {
+    'kamada kawai': networkx.kamada_kawai_layout,
+    'spring': partial(networkx.spring_layout, k=1),
+    'circular': networkx.circular_layout,
+    'force': force_layout,
+}
+
+
+def graph_hash(graph) -> str:
+    digest = hashlib.sha1()
+    for graph_id in sorted(map(str, graph)):
+        digest.update(graph_id.encode() + b'\0')
+    for edge in sorted('\0'.join(sorted(map(str, edge))) for edge in graph.edges()):
+        digest.update(edge.encode() + b'\1')
+    return digest.hexdigest()
+
+
+def make_layout(graph, layout: str) -> dict:
+    """Positions are cached by the layout and the graph structure, restyling doesn't recompute them"""
+
+    if layout not in LAYOUTS:
+        return networkx.random_layout(graph)
+
+    key = f'{layout}:{graph_hash(graph)}'
+    LAYOUT_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with shelve.open(LAYOUT_CACHE_FILE.as_posix()) as cache:
+        _, positions = cache.get(key, (None, None))
+        if positions is None:
+            positions = LAYOUTS[layout](graph)
+        else:
+            logger.debug('Layout cache hit.', layout=layout, key=key)
+        cache[key] = (time.time(), positions)  # last used at
+
+        if len(cache) > LAYOUT_CACHE_SIZE:
+            used_at = {cached_key: cache[cached_key][0] for cached_key in cache}
+            for stale_key in sorted(used_at, key=used_at.get)[:len(cache) - LAYOUT_CACHE_SIZE]:
+                del cache[stale_key]
+
+    return positions
+
+
+def check_nodes(nodes) -> bool:
     refs_exist = [TomlNodeReferences(node).checks_passed() for node in nodes if isinstance(node, TomlNode)]
     is_valid = all(refs_exist)
 
@@ -208,6 +347,13 @@ def check(path: Path):
         logger.error('Fail.')
 
     return is_valid
+
+
+@cli.command()
+def check(path: Path):
+    """Ensure all the checks are passed"""
+
+    return check_nodes(scan(path))
     
 
 @cli.command()
@@ -216,41 +362,30 @@ def create_plot(paths: List[Path], output_file="plot.png", relations: bool = Fal
                 title: bool = False):
     """Display files and their references"""
 
-    def make_emphasizing_coefficients(graph_) -> Tuple[dict, dict]:
+    def make_emphasizing_coefficients(graph_) -> np.ndarray:
         """Make the size coefficients depended on neighbors count"""
 
-        node_nbr_counts = {graph_id: len(nbrs) for (graph_id, nbrs) in graph_.adjacency()}
-        nbr_median = median(node_nbr_counts.values())
-        nbr_cnt_groups_asc = sorted(filter(lambda nbr_count: nbr_count > nbr_median,
-                                           set(node_nbr_counts.values())))
-        nbr_cnt_groups_k = {group: group / nbr_cnt_groups_asc[0] * SIZE_K for group in nbr_cnt_groups_asc}
-        return node_nbr_counts, nbr_cnt_groups_k
+        nbr_counts = np.fromiter((len(nbrs) for _, nbrs in graph_.adjacency()), dtype=float, count=len(graph_))
+        is_emphasized = nbr_counts > np.median(nbr_counts)
+        if not is_emphasized.any():
+            return np.zeros_like(nbr_counts)
+        return np.where(is_emphasized, nbr_counts / nbr_counts[is_emphasized].min() * SIZE_K, 0)
 
-    def subplot(path, _layout=None):
-        source_nodes = list(nodes_from_files(path))
+    def subplot(path, source_nodes, _layout=None):
         logger.debug('Subplot nodes.', subplot=path.name, nodes=source_nodes)
 
         graph = create_graph(source_nodes, add_edges=relations)
-        layout_ = networkx.random_layout(graph)
-        if _layout == 'kamada kawai':
-            layout_ = networkx.kamada_kawai_layout(graph)
-        elif _layout == 'spring':
-            layout_ = networkx.spring_layout(graph, k=1)
-        elif _layout == 'circular':
-            layout_ = networkx.circular_layout(graph)
-
-        colors, sizes = [], []
-        groups, coefficients = make_emphasizing_coefficients(graph)
-        for graph_id, node_attr in graph.nodes.data('attrs'):
-            colors.append(node_attr.color)
-            size = node_attr.size
-            if emphasize:
-                k = coefficients.get(groups[graph_id], 0)
-                size = size + k
-            sizes.append(size)
+        layout_ = make_layout(graph, _layout)
+
+        node_attrs = [node_attr for _, node_attr in graph.nodes.data('attrs')]
+        colors = to_rgba_array([node_attr.color for node_attr in node_attrs])
+        sizes = np.fromiter((node_attr.size for node_attr in node_attrs), dtype=float, count=len(node_attrs))
+        coefficients = make_emphasizing_coefficients(graph)
+        if emphasize:
+            sizes = sizes + coefficients
 
         labels = {}
-        for graph_id, node_attr in graph.nodes.data('attrs'):
+        for graph_id, node_attr, k in zip(graph, node_attrs, coefficients):
             if not names:
                 break
 
@@ -258,29 +393,29 @@ def create_plot(paths: List[Path], output_file="plot.png", relations: bool = Fal
                 labels[graph_id] = graph_id.name
                 continue
 
-            if (emphasize and coefficients.get(groups[graph_id])) \
-                    or node_attr.error:
+            if (emphasize and k) or node_attr.error:
                 labels[graph_id] = graph_id.name
 
         networkx.draw(graph, pos=layout_,
                       with_labels=True, labels=labels, verticalalignment='bottom', horizontalalignment='left',
-                      node_shape='o', node_size=list(sizes), node_color=list(colors),
+                      node_shape='o', node_size=sizes, node_color=colors,
                       font_size=8, width=0.2, font_family=FONT_FAMILY, font_color='black',
                       linewidths=0.4, edgecolors='white',
                       bbox={'edgecolor': 'black', 'facecolor': 'white', 'linewidth': 0.2,
                             'boxstyle': 'round', 'alpha': 0.3},
                       edge_color=EDGE_COLOR)  # edges between nodes
 
-    for path in paths:
-        check(path)
+    paths_nodes = {path: scan(path) for path in paths}  # one scan is shared by the checks and the plots
+    for source_nodes in paths_nodes.values():
+        check_nodes(source_nodes)
 
-    for i, source_dir in enumerate(paths, start=1):
+    for i, (source_dir, source_nodes) in enumerate(paths_nodes.items(), start=1):
         nrows, ncols, idx = len(paths), 1, i
         ax = plt.subplot(nrows, ncols, idx)
         if title:
             title = strip_home_dir(source_dir).name
             ax.set_title(title, font=FONT_FAMILY)
-        subplot(source_dir, _layout=layout)
+        subplot(source_dir, source_nodes, _layout=layout)
 
     plt.savefig(output_file, dpi=dpi)
 
@@ -13,6 +13,74 @@ from bokeh.application.application import Application
 from bokeh.server.server import Server
 
 
+DOWNSAMPLING = 'lttb'  # lttb | minmax
+LTTB_PRESELECT_K = 4  # min-max points per an output point before LTTB on large windows
+SYNTHETIC_POINTS = None  # e.g. 5_000_000, a random walk instead of the AAPL sample
+
+
+def minmax_indices(y, n_bins):
+    """Indices of the min and max points of every bin and of the edge points, in order"""
+    bin_size = -(-len(y) // n_bins)
+    padded = np.full(n_bins * bin_size, np.nan)
+    padded[:len(y)] = y
+    bins = padded.reshape(n_bins, bin_size)
+    filled = ~np.isnan(bins).all(axis=1)
+    offsets = np.arange(n_bins)[filled] * bin_size
+    indices = np.concatenate(([0, len(y) - 1],
+                              offsets + np.nanargmin(bins[filled], axis=1),
+                              offsets + np.nanargmax(bins[filled], axis=1)))
+    return np.unique(indices)
+
+
+def lttb_indices(x, y, n_out):
+    """Largest-Triangle-Three-Buckets, the first and last points are kept"""
+    if n_out >= len(x) or n_out < 3:
+        return np.arange(len(x))
+
+    edges = np.linspace(1, len(x) - 1, n_out - 1).astype(np.int64)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0], indices[-1] = 0, len(x) - 1
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else len(x)
+        next_x, next_y = x[end:next_end].mean(), y[end:next_end].mean()  # average of the next bucket
+        prev_x, prev_y = x[indices[i]], y[indices[i]]
+        areas = np.abs((prev_x - next_x) * (y[start:end] - prev_y) - (prev_x - x[start:end]) * (next_y - prev_y))
+        indices[i + 1] = start + np.argmax(areas)
+    return indices
+
+
+class SeriesView:
+    """The full series stays here, a plot source gets a downsampled window sized to the plot width"""
+
+    def __init__(self, x, y, width, method=DOWNSAMPLING):
+        self.x, self.y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)  # x is epoch ms
+        self.width = width
+        self.method = method
+        self.source = ColumnDataSource(data=dict(date=[], close=[]))
+
+    def downsample(self, start=None, end=None):
+        # one point beyond the window on each side keeps the line continuous at the edges
+        lo = max(np.searchsorted(self.x, start) - 1, 0) if start is not None else 0
+        hi = min(np.searchsorted(self.x, end, side='right') + 1, len(self.x)) if end is not None else len(self.x)
+        x, y = self.x[lo:hi], self.y[lo:hi]
+
+        if len(x) <= 2 * self.width:
+            return x, y
+        if self.method == 'minmax':
+            indices = minmax_indices(y, self.width)
+        else:
+            if len(x) > LTTB_PRESELECT_K * self.width:
+                preselected = minmax_indices(y, LTTB_PRESELECT_K * self.width // 2)
+                x, y = x[preselected], y[preselected]
+            indices = lttb_indices(x, y, self.width)
+        return x[indices], y[indices]
+
+    def update(self, start=None, end=None):
+        x, y = self.downsample(start, end)
+        self.source.data = dict(date=x, close=y)
+
+
 def assign_callbacks(plot):
 
     def _print_out_callback(event_name, *args):
@@ -34,26 +102,39 @@ def assign_callbacks(plot):
         plot.on_event(event, partial(_print_out_callback, event_name))
 
 
-def pan_end_callback(selected_range, event):
+def pan_end_callback(selected_range, event, view=None):
     start= datetime.utcfromtimestamp(selected_range.start/1000)
     end = datetime.utcfromtimestamp(selected_range.end/1000)
     print(f'Attrs on PanEnd: start={start}, end={end}')
+    if view is not None:
+        view.update(selected_range.start, selected_range.end)
 
 
 def on_change_callback(attr, old, new):
     print(f'Attr: {attr}, old={old}, new={new}')
 
 
+def make_series():
+    if SYNTHETIC_POINTS:
+        dates = np.datetime64('2000-01-01', 'ms') + np.arange(SYNTHETIC_POINTS) * np.timedelta64(1, 'm')
+        closes = 400 + np.cumsum(np.random.default_rng(0).normal(size=SYNTHETIC_POINTS))
+    else:
+        dates = np.array(AAPL['date'], dtype='datetime64[ms]')
+        closes = np.array(AAPL['adj_close'])
+    return dates.astype(np.int64), closes
+
+
 def make_models():
-    dates = np.array(AAPL['date'], dtype=np.datetime64)
-    source = ColumnDataSource(data=dict(date=dates, close=AAPL['adj_close']))
-    # source = ColumnDataSource(data=dict(date=dates, close=np.random.randint(100,700, 3270)))
+    dates, closes = make_series()
+    start, end = dates[len(dates) * 15 // 32], dates[len(dates) * 25 // 32]  # 1500 and 2500 of the AAPL
 
     data_plot = figure(height=300, width=800, tools="xpan", toolbar_location=None,
                x_axis_type="datetime", x_axis_location="above",
-               background_fill_color="#efefef", x_range=(dates[1500], dates[2500]))
+               background_fill_color="#efefef", x_range=(start, end))
+    data_view = SeriesView(dates, closes, width=data_plot.width)
+    data_view.update(start, end)
 
-    data_plot.line('date', 'close', source=source)
+    data_plot.line('date', 'close', source=data_view.source)
     data_plot.yaxis.axis_label = 'Price'
 
     range_plot = figure(title=None,
@@ -71,19 +152,22 @@ def make_models():
     range_tool.overlay.fill_color = "yellow"
     range_tool.overlay.fill_alpha = 0.2
 
-    range_plot.line('date', 'close', source=source, color='yellow')
+    range_view = SeriesView(dates, closes, width=range_plot.width)  # the whole series, computed once
+    range_view.update()
+    range_plot.line('date', 'close', source=range_view.source, color='yellow')
     range_plot.ygrid.grid_line_color = None
     range_plot.add_tools(range_tool)
     range_plot.toolbar.active_multi = range_tool
 
-    return data_plot, range_plot, range_tool
+    return data_plot, range_plot, range_tool, data_view
 
 
 def make_layout():
-    data_plot, range_plot, range_tool = make_models()
+    data_plot, range_plot, range_tool, data_view = make_models()
 
     # assign_callbacks(range_plot)
-    range_plot.on_event(bokeh.events.PanEnd, partial(pan_end_callback, range_tool.x_range))
+    range_plot.on_event(bokeh.events.PanEnd, partial(pan_end_callback, range_tool.x_range, view=data_view))
+    data_plot.on_event(bokeh.events.RangesUpdate, partial(pan_end_callback, range_tool.x_range, view=data_view))
     # print('Initital values.', 'start=', range_tool.x_range.start, 'end=', range_tool.x_range.end)
     # range_tool.x_range.on_change('start', on_change_callback)
     # range_tool.x_range.on_change('end', on_change_callback)
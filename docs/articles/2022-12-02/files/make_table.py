@@ -1,7 +1,9 @@
+import hashlib
+from pathlib import Path
+
 import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec
 import numpy as np
-from scipy.misc import derivative
 
 
 FUNCTION_COLUMN = 0
@@ -16,6 +18,10 @@ TITLE_COLOR = ANNOTATION_COLOR = 'xkcd:grey purple'
 SECONDARY_LINE_WIDTH = 1
 SECONDARY_ALPHA = 0.5
 MARGIN_Y = 0.2
+X_GRID = (3, 30, 1)  # start, stop, step
+DERIVATIVE_METHOD = 'central'  # central | analytic
+DERIVATIVE_DX = 1.0  # the scipy.misc.derivative default the table was published with
+GRIDS_CACHE_DIR = Path.home() / '.cache' / 'derivative-table'
 
 ANN_LIN = r'$f(x)$'
 ANN_QUAD = r'$f(x^2)$'
@@ -40,8 +46,47 @@ def lin(x):
     return x
 
 
-def create_y_array(func, *args):
-    return func(*args)
+FUNCTIONS = (  # title, function, analytic derivative
+    (ANN_LIN, lin, np.ones_like),
+    (ANN_QUAD, lambda x: np.power(x, 2), lambda x: 2 * x),
+    (ANN_CUB, lambda x: np.power(x, 3), lambda x: 3 * np.power(x, 2)),
+    (ANN_EXP, np.exp, np.exp),
+    (ANN_LOG, np.log, lambda x: 1 / x),
+    (ANN_SIN, np.sin, np.cos),
+    (ANN_COS, np.cos, lambda x: -np.sin(x)),
+    (ANN_TAN, np.tan, lambda x: 1 / np.power(np.cos(x), 2)),
+)
+
+
+def compute_grids(x_grid=X_GRID, method=DERIVATIVE_METHOD, dx=DERIVATIVE_DX):
+    """Values and derivatives of all the functions over the whole grid, rows are in the FUNCTIONS order.
+    Central differences evaluate every function once on the stacked `x - dx, x, x + dx` grid.
+    Grids are cached on disk by the grid, method, step and the script source, an edited function isn't stale,
+    the grids of the previous script versions are removed."""
+
+    script_key = hashlib.sha1(Path(__file__).read_bytes()).hexdigest()
+    grid_key = hashlib.sha1(repr((x_grid, method, dx)).encode()).hexdigest()
+    cache_file = GRIDS_CACHE_DIR / f'{script_key}-{grid_key}.npz'
+    if cache_file.exists():
+        with np.load(cache_file) as grids:
+            return grids['x'], grids['values'], grids['derivatives']
+
+    x_array = np.arange(*x_grid, dtype=np.float64)
+    if method == 'analytic':
+        values = np.stack([func(x_array) for _, func, _ in FUNCTIONS])
+        derivatives = np.stack([deriv(x_array) for _, _, deriv in FUNCTIONS])
+    else:
+        stacked_x = x_array + np.array([-dx, 0, dx])[:, None]  # 3 x n
+        stacked = np.stack([func(stacked_x) for _, func, _ in FUNCTIONS])  # functions x 3 x n
+        values = stacked[:, 1]
+        derivatives = (stacked[:, 2] - stacked[:, 0]) / (2 * dx)
+
+    GRIDS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    for stale_file in GRIDS_CACHE_DIR.glob('*.npz'):  # other methods and steps of the same script are kept
+        if not stale_file.name.startswith(f'{script_key}-'):
+            stale_file.unlink()
+    np.savez(cache_file, x=x_array, values=values, derivatives=derivatives)
+    return x_array, values, derivatives
 
 
 class Style:
@@ -110,104 +155,17 @@ class Style:
 
 def make_plots():
     fig = plt.figure(dpi=150)
-    x_array = np.arange(3, 30, 1)
-
-    # Lin
-    panes = fig.subfigures(8, 1)
-    pane = panes[0]   
-    func_axes, deriv_axes = pane.subplots(2, 1)
-
-    y_array = create_y_array(lin, x_array)
-    func_axes.plot(x_array, y_array)
-    Style(func_axes, title=ANN_LIN).setup(y_array)
-
-    y_array = create_y_array(derivative, lin, x_array)
-    deriv_axes.plot(x_array, y_array)
-    Style(deriv_axes, column=DERIVATIVE_COLUMN).setup(y_array)
-
-    # Quad
-    pane = panes[1]
-    func_axes, deriv_axes = pane.subplots(2, 1)
-
-    y_array = create_y_array(np.power, x_array, 2)
-    func_axes.plot(x_array, y_array)
-    Style(func_axes, title=ANN_QUAD).setup(y_array)
-
-    y_array = create_y_array(derivative, lambda x: np.power(x, 2), x_array)
-    deriv_axes.plot(x_array, y_array,)
-    Style(deriv_axes, column=DERIVATIVE_COLUMN).setup(y_array)
-
-    # Cubic
-    pane = panes[2]
-    func_axes, deriv_axes = pane.subplots(2, 1)
-
-    y_array = create_y_array(np.power, x_array, 3)
-    func_axes.plot(x_array, y_array,)
-    Style(func_axes, title=ANN_CUB).setup(y_array)
-
-    y_array = create_y_array(derivative, lambda x: np.power(x, 3), x_array)
-    deriv_axes.plot(x_array, y_array)
-    Style(deriv_axes, column=DERIVATIVE_COLUMN).setup(y_array)
-
-    # Exp
-    pane = panes[3]
-    func_axes, deriv_axes = pane.subplots(2, 1)
-
-    y_array = create_y_array(np.exp, x_array)
-    func_axes.plot(x_array, y_array)
-    Style(func_axes, title=ANN_EXP).setup(y_array)
-
-    y_array = create_y_array(derivative, np.exp, x_array)
-    deriv_axes.plot(x_array, y_array)
-    Style(deriv_axes, column=DERIVATIVE_COLUMN).setup(y_array)
-
-    # Ln
-    pane = panes[4]
-    func_axes, deriv_axes = pane.subplots(2, 1)
-
-    y_array = create_y_array(np.log, x_array)
-    func_axes.plot(x_array, y_array)
-    Style(func_axes, title=ANN_LOG).setup(y_array)
-
-    y_array = create_y_array(derivative, np.log, x_array)
-    deriv_axes.plot(x_array, y_array)
-    Style(deriv_axes, column=DERIVATIVE_COLUMN).setup(y_array)
-
-    # Sin
-    pane = panes[5]
-    func_axes, deriv_axes = pane.subplots(2, 1)
-
-    y_array = create_y_array(np.sin, x_array)
-    func_axes.plot(x_array, y_array)
-    Style(func_axes, title=ANN_SIN).setup(y_array)
-
-    y_array = create_y_array(derivative, np.sin, x_array)
-    deriv_axes.plot(x_array, y_array)
-    Style(deriv_axes, column=DERIVATIVE_COLUMN).setup(y_array)
-
-    # Cos
-    pane = panes[6]
-    func_axes, deriv_axes = pane.subplots(2, 1)
-
-    y_array = create_y_array(np.cos, x_array)
-    func_axes.plot(x_array, y_array)
-    Style(func_axes, title=ANN_COS).setup(y_array)
-
-    y_array = create_y_array(derivative, np.cos, x_array)
-    deriv_axes.plot(x_array, y_array)
-    Style(deriv_axes, column=DERIVATIVE_COLUMN).setup(y_array)
+    x_array, values, derivatives = compute_grids()
 
-    # Tan
-    pane = panes[7]
-    func_axes, deriv_axes = pane.subplots(2, 1)
+    panes = fig.subfigures(len(FUNCTIONS), 1)
+    for pane, (title, *_), y_array, dy_array in zip(panes, FUNCTIONS, values, derivatives):
+        func_axes, deriv_axes = pane.subplots(2, 1)
 
-    y_array = create_y_array(np.tan, x_array)
-    func_axes.plot(x_array, y_array)
-    Style(func_axes, title=ANN_TAN).setup(y_array)
+        func_axes.plot(x_array, y_array)
+        Style(func_axes, title=title).setup(y_array)
 
-    y_array = create_y_array(derivative, np.tan, x_array)
-    deriv_axes.plot(x_array, y_array)
-    Style(deriv_axes, column=DERIVATIVE_COLUMN).setup(y_array)
+        deriv_axes.plot(x_array, dy_array)
+        Style(deriv_axes, column=DERIVATIVE_COLUMN).setup(dy_array)
 
     # plt.tight_layout()
     plt.show()
@@ -1,11 +1,11 @@
-import os
+import gc
+import time
 import functools
 import sys
-from typing import List, Tuple, Set
+from typing import List, Optional, Tuple, Set
 from xml.dom.minidom import getDOMImplementation
 from dataclasses import dataclass
 from itertools import chain
-from contextlib import suppress
 from pathlib import Path
 from datetime import datetime
 from argparse import ArgumentParser
@@ -15,21 +15,34 @@ from enum import Enum
 import aspectlib
 import aspectlib.debug
 from lxml.html import Element, fromstring, tostring as _tostring
-from jinja2 import Environment, FileSystemLoader, select_autoescape
 from pygments import highlight
 from pygments.lexers.python import PythonLexer
 from pygments.lexers.shell import BashSessionLexer
 from pygments.lexers.configs import TOMLLexer
 from pygments.formatters.html import HtmlFormatter
 from slugify import slugify
-from more_itertools import split_before
 
 import constants as cns
-from filters import trailing_slash, to_rfc822, prepend_site_address, update_classes
+from filters import trailing_slash, apply_classes
 from utils import (make_header_id, wrap_unwrap_fake_tag, first_h1_text, first_p_text,
                    replace_relative_with_dots, parser_render, extract_path_date)
-from summary import summarize, summarize_refine
-from thumbnail import create_thumbnail
+from thumbnail import create_thumbnail, cache as thumbnail_cache
+from profiling import MemoryReport
+from history import BuildHistory, BuildRecord, CacheStats, count_output_bytes, peak_rss
+from fonts import collect_charset, subset_font_faces
+from critical import inline_critical_css
+from navigation import PageNode, LinkGraph
+from manifest import ManifestType, dump_manifest, compare_manifests, text_hash
+from service_worker import precache_entries
+from figures import regenerate_figures
+from images import optimize_attached_images
+from export import clean_text_tree, split_sections, make_article_export, export_articles
+from vectors import export_vectors
+from formulas import apply_math
+from chunking import plan_chunks
+from textrank import summarize_corpus
+from context import BuildContext
+from writer import DiskWriter, MemoryWriter, SiteType
 
 
 HEADERS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
@@ -38,22 +51,6 @@ TOC_LOWEST_HEADER = 3  # Meaning <h3>
 TocType = List[Tuple[int, str]]
 
 Dom = getDOMImplementation()
-env = Environment(loader=FileSystemLoader(cns.TEMPLATES_DIR.as_posix()), trim_blocks=True,
-                  autoescape=select_autoescape(['html']))
-env.globals['site_address'] = cns.SITE_ADDRESS
-env.globals['site_name'] = cns.SITE_NAME
-env.globals['analytics_service_token'] = cns.ANALYTICS_SERVICE_TOKEN
-env.globals['analytics_service_js'] = cns.ANALYTICS_SERVICE_JS
-env.globals['analytics_service_page'] = cns.ANALYTICS_SERVICE_PAGE
-env.globals['monitoring_service_page'] = cns.MONITORING_SERVICE_PAGE
-env.globals['memocards_service_address'] = cns.MEMOCARDS_SERVICE_ADDRESS
-env.globals['engqa_service_address'] = cns.ENGQA_SERVICE_ADDRESS
-env.globals['statuspage_service_page'] = cns.STATUSPAGE_SERVICE_ADDRESS
-env.filters['trailing_slash'] = trailing_slash
-env.filters['to_rfc822'] = to_rfc822
-env.filters['prepend_site_address'] = prepend_site_address
-env.filters['update_classes'] = update_classes
-env.filters['any'] = any
 
 tostring = functools.partial(_tostring, encoding='unicode')
 
@@ -84,6 +81,18 @@ class IndexViewEnum(str, Enum):
     summary = 'summary'
 
 
+@dataclass
+class ArticleTransform:
+    """Template independent results of an article html, shared by the variants"""
+    content_html: str
+    toc_html: str
+    article_data: ArticleData
+    files_paths: Set[str]
+    images: dict
+    title: str
+    description: str
+
+
 @dataclass
 class ThumbnailPair:
     source_path: str
@@ -107,15 +116,46 @@ def list_article_md_files(articles_dir: Path, reverse=False) -> list:
     return md_files
 
 
-def generate_sitemap(articles_data: List[ArticleData]):
+def generate_sitemap(env, articles_data: List[ArticleData]):
     template = env.get_template(cns.SITEMAP_TEMPLATE_FILE.name)
     xml = template.render(articles_data=articles_data)
     return xml
 
 
-def generate_rss(articles_data: List[ArticleData]):
+def collect_site_texts(articles_dir: Path) -> List[str]:
+    """All the text a site can display: articles, templates, the site name"""
+    texts = [cns.SITE_NAME]
+    texts.extend(template_file.read_text() for template_file in cns.TEMPLATES_DIR.glob('*.jinja'))
+    texts.extend(fromstring(parser_render(md_file)).text_content()
+                 for md_file in list_article_md_files(articles_dir))
+    return texts
+
+
+def generate_service_worker(env, manifest: ManifestType):
+    template = env.get_template(cns.SERVICE_WORKER_TEMPLATE_FILE.name)
+    font_links = [face.link for face in env.globals['font_faces']]
+    js = template.render(precache_entries=precache_entries(manifest, font_links))
+    return js
+
+
+def make_link_graph(ctx: BuildContext, articles_dir: Path) -> LinkGraph:
+    """Pages estimated by the previous build output or by the article html"""
+    pages = []
+    for md_file in list_article_md_files(articles_dir):
+        html = parser_render(md_file)
+        symlink_name = slugify(first_h1_text(fromstring(html)))
+        relative_link = cns.DOCS_ARTICLES_DIR.joinpath(symlink_name).relative_to(cns.DOCS_DIR)
+        built_file = ctx.path(cns.DOCS_ARTICLES_DIR) / md_file.parent.name / cns.DOCS_INDEX_FILE.name
+        size = ctx.writer.size(built_file) or len(html.encode())
+        pages.append(PageNode(link='/' + trailing_slash(relative_link), created_date=extract_path_date(md_file.parent.name),
+                              size=size, hrefs=HTMLGen.retrieve_links(html)))
+
+    return LinkGraph(pages, ctx.prefetch_budget)
+
+
+def generate_rss(env, articles_data: List[ArticleData]):
     template = env.get_template(cns.RSS_TEMPLATE_FILE.name)
-    pub_date = datetime.now()
+    pub_date = max((adata.created_date for adata in articles_data), default=datetime.min)  # stable between builds
     xml = template.render(pub_date=pub_date, articles_data=articles_data)
     return xml
 
@@ -145,18 +185,41 @@ class HTMLGen:
                  'language-toml': TOMLLexer}
 
     @staticmethod
-    def generate_index_html(articles_data: List[ArticleData], view: IndexViewEnum, view_data=None):
+    def generate_index_html(env, articles_data: List[ArticleData], view: IndexViewEnum, view_data=None,
+                            prefetch_links=()):
         template = env.get_template(cns.INDEX_TEMPLATE_FILE.name)
         html = template.render(articles_data=articles_data, selected_view=view,
-                               IndexViewEnum=IndexViewEnum, view_data=view_data)
+                               IndexViewEnum=IndexViewEnum, view_data=view_data,
+                               prefetch_links=prefetch_links)
+        html = inline_critical_css(html, template.name)
         return html
 
     @staticmethod
-    def generate_article_html(md_file,  article_index_file, article_source_dir,
+    def generate_article_html(env, md_file, article_source_dir,
                               font_icons: bool = False, highlight: bool = False,
-                              track_analytics: bool = cns.TRACK_ANALYTICS):
+                              track_analytics: bool = cns.TRACK_ANALYTICS, link_graph: LinkGraph = None,
+                              math: bool = False):
         """Article is two big blocks `toc`, `content`"""
-        html = parser_render(md_file)
+        transform = HTMLGen.transform_article(md_file, article_source_dir, font_icons, highlight, track_analytics,
+                                              math)
+        article_data = transform.article_data
+
+        template = env.get_template(cns.ARTICLE_TEMPLATE_FILE.name)
+        prefetch_links = link_graph.article_hints(article_data.created_date) if link_graph else ()
+        
+        html = template.render(content=transform.content_html, toc=transform.toc_html, title=transform.title,
+                               description=transform.description, article_data=article_data,
+                               prefetch_links=prefetch_links)
+        html = inline_critical_css(html, template.name)
+
+        return html, transform.toc_html, article_data, transform.files_paths, transform.images
+
+    @staticmethod
+    @functools.lru_cache(maxsize=cns.PARSER_RENDER_CACHE_SIZE)
+    def transform_article(md_file, article_source_dir, font_icons: bool = False, highlight: bool = False,
+                          track_analytics: bool = cns.TRACK_ANALYTICS, math: bool = False) -> ArticleTransform:
+        """Cached by the transform flags, variants with the same flags don't repeat the work"""
+        html = parser_render(md_file, math)
 
         content_html = HTMLGen._apply_headers_anchors(html)
 
@@ -166,18 +229,15 @@ class HTMLGen:
         content_html = HTMLGen._apply_font_icons(content_html) if font_icons else content_html
         content_html = HTMLGen._apply_highlighting(content_html) if highlight else content_html
         content_html = HTMLGen._apply_analytics_event_type(content_html) if track_analytics else content_html
+        content_html = HTMLGen._apply_classes(content_html, cns.ARTICLE_CONTENT_CLASSES)
         root_element = fromstring(content_html)
+        content_html = apply_math(content_html) if math else content_html
         files_paths, images = HTMLGen.retrieve_attached_files_paths(html)
-        article_data = HTMLGen._make_article_data(content_html, article_index_file, article_source_dir, images)
+        article_data = HTMLGen._make_article_data(content_html, article_source_dir, images)
 
-        template = env.get_template(cns.ARTICLE_TEMPLATE_FILE.name)
-        title = first_h1_text(root_element)
-        description = first_p_text(root_element)
-        
-        html = template.render(content=content_html, toc=toc_html, title=title,
-                               description=description, article_data=article_data)
-
-        return html, toc_html, article_data, files_paths, images
+        return ArticleTransform(content_html=content_html, toc_html=toc_html, article_data=article_data,
+                                files_paths=files_paths, images=images,
+                                title=first_h1_text(root_element), description=first_p_text(root_element))
 
     @staticmethod
     def retrieve_attached_files_paths(html) -> Tuple[Set[str], dict]:
@@ -195,6 +255,12 @@ class HTMLGen:
 
         return files, images
 
+    @staticmethod
+    def retrieve_links(html) -> List[str]:
+        element = fromstring(html)
+        return [el.attrib['href'] for el in element.iter('a')
+                if el.attrib.get('href', '#')[0] != '#']
+
     @staticmethod
     def _apply_font_icons(html):
         root = fromstring(wrap_unwrap_fake_tag(html))
@@ -285,6 +351,15 @@ class HTMLGen:
         html = wrap_unwrap_fake_tag(html, wrap=False)
         return html
 
+    @staticmethod
+    def _apply_classes(html: str, rules) -> str:
+        """All the selectors in one pass instead of a template filter per selector"""
+        root_element = fromstring(wrap_unwrap_fake_tag(html))
+        apply_classes(root_element, rules)
+        html = tostring(root_element)
+        html = wrap_unwrap_fake_tag(html, wrap=False)
+        return html
+
     @staticmethod
     def _apply_responsive_table(html: str):
         replacing = []
@@ -304,7 +379,7 @@ class HTMLGen:
         return html
 
     @staticmethod
-    def _make_article_data(html: str, article_index_file, article_source_dir, images) -> ArticleData:
+    def _make_article_data(html: str, article_source_dir, images) -> ArticleData:
         root_element = fromstring(html)
         symlink_name = slugify(first_h1_text(root_element))
         article_relative_symlink = cns.DOCS_ARTICLES_DIR.joinpath(symlink_name).relative_to(cns.DOCS_DIR)
@@ -382,8 +457,11 @@ class HTMLGen:
 
 class ViewBase:
 
-    def __init__(self, is_enabled=False):
+    def __init__(self, ctx: BuildContext, is_enabled=False, prefetch_links=()):
+        self.ctx = ctx
         self.is_enabled = is_enabled
+        self.prefetch_links = prefetch_links
+        self.cache_stats = CacheStats()
 
     def create(self, *args, **kwargs):
         if not self.is_enabled:
@@ -392,11 +470,10 @@ class ViewBase:
         self._create(*args, **kwargs)
 
     def _create_index(self, view: IndexViewEnum, articles_data, view_data=None) -> Path:
-        index_html = HTMLGen.generate_index_html(articles_data, view, view_data)
-        index_dir = cns.VIEWS_DIR / view.value
+        index_html = HTMLGen.generate_index_html(self.ctx.env, articles_data, view, view_data, self.prefetch_links)
+        index_dir = self.ctx.path(cns.VIEWS_DIR) / view.value
         index_file = index_dir / cns.DOCS_INDEX_FILE.name
-        index_file.parent.mkdir(parents=True, exist_ok=True)
-        index_file.write_text(index_html)
+        self.ctx.writer.write_text(index_file, index_html)
 
         return index_dir
 
@@ -404,14 +481,12 @@ class ViewBase:
         """Symlinks to the original articles and files dirs."""
 
         articles_dir_symlink = view_dir / cns.DOCS_ARTICLES_DIR.name
-        relative_target_path = replace_relative_with_dots(articles_dir_symlink, cns.DOCS_DIR)
-        if not articles_dir_symlink.is_symlink():
-            articles_dir_symlink.symlink_to(relative_target_path, target_is_directory=True)
+        relative_target_path = replace_relative_with_dots(articles_dir_symlink, self.ctx.docs_dir)
+        self.ctx.writer.symlink(relative_target_path.as_posix(), articles_dir_symlink)
 
         files_dir_symlink = view_dir / cns.DOCS_FILES_DIR.name
-        relative_target_path = replace_relative_with_dots(files_dir_symlink, cns.DOCS_DIR)
-        if not files_dir_symlink.is_symlink():
-            files_dir_symlink.symlink_to(relative_target_path, target_is_directory=True)
+        relative_target_path = replace_relative_with_dots(files_dir_symlink, self.ctx.docs_dir)
+        self.ctx.writer.symlink(relative_target_path.as_posix(), files_dir_symlink)
 
 
 class PreviewView(ViewBase):
@@ -444,7 +519,8 @@ class PreviewView(ViewBase):
 
         for tpair in thumbnail_pairs:
             thumbnail_path = index_dir / tpair.thumbnail_link
-            create_thumbnail(tpair.source_path, thumbnail_path)
+            self.cache_stats.add(create_thumbnail.__cache_key__(tpair.source_path) in thumbnail_cache)
+            self.ctx.writer.write_bytes(thumbnail_path, create_thumbnail(tpair.source_path))
  
     def _make_thumbnail_link(self, date, link):
         return cns.THUMBNAILS_DIR / date.strftime('%Y-%m-%d') / link
@@ -452,53 +528,222 @@ class PreviewView(ViewBase):
 
 class SummaryView(ViewBase):
 
+    def __init__(self, ctx: BuildContext, is_enabled=False, prefetch_links=(), backend=cns.SUMMARY_BACKENDS[0]):
+        super().__init__(ctx, is_enabled, prefetch_links)
+        self.backend = backend
+
     def _create(self, articles_dir, articles_data):
+        articles_sections = {article_md_file: list(self._split_text_iter(self._clean_text(article_md_file)))
+                             for article_md_file in list_article_md_files(articles_dir, reverse=True)}
+        summaries = self._summarize(articles_sections)
+
         view_data = {}
-        for article_md_file in list_article_md_files(articles_dir, reverse=True):
-            summary = self._summarize(article_md_file)
+        for article_md_file, summary in summaries.items():
             created_date = extract_path_date(article_md_file.parent.name)
             view_data[created_date] = summary
         
         index_dir = self._create_index(IndexViewEnum.summary, articles_data, view_data)
         self._create_symlinks(index_dir)
 
-    def _summarize(self, md_file: Path):
-        clean_element = self._clean_text(md_file)
-        text_chunks = list(self._split_text_iter(clean_element))
-        # result = summarize(text_chunks)
-        result = summarize_refine(text_chunks)
-        return result
+    def _summarize(self, articles_sections):
+        """All the articles at once, TextRank runs offline, the LLM is an optional upgrade"""
+        if self.backend != 'llm':
+            return summarize_corpus(articles_sections, cns.SUMMARY_SENTENCES_COUNT)
 
-    def _clean_text(self, md_file: Path) -> Element:
-        """Remove code blocks, images, and tables from an article's source text"""   
+        from summary import summarize, summarize_refine, cache as summary_cache  # network, keys, langchain
 
-        html = parser_render(md_file)
-        doc = fromstring(html)
-        remove_exprs = ['.//pre[code]', './/table', './/img']
-        findall = lambda doc, xpath_list: chain(*(doc.findall(xpath) for xpath in xpath_list))
-        
-        remove_elements = findall(doc, remove_exprs)
-        for element in remove_elements:
-            try:
-                doc.remove(element)
-            except ValueError as e:
-                # error `Element is not a child of this node` more likely refers to an already removed element.
-                print(e)
+        plans = {article_md_file: plan_chunks(sections, cns.SUMMARY_CHUNK_TOKENS)
+                 for article_md_file, sections in articles_sections.items()}
+        missed_plans = [plan for plan in plans.values() if summarize_refine.__cache_key__(plan.chunks) not in summary_cache]
+        self.cache_stats = CacheStats(hits=len(plans) - len(missed_plans), misses=len(missed_plans))
+        self._print_prediction(missed_plans)
+        # return {article_md_file: summarize(plan.chunks) for article_md_file, plan in plans.items()}
+        return {article_md_file: summarize_refine(plan.chunks) for article_md_file, plan in plans.items()}
+
+    def _print_prediction(self, plans):
+        """Memoized summaries don't call the model"""
+        print(f'Summary: {len(plans)} articles to summarize, {sum(plan.calls for plan in plans)} predicted calls, '
+              f'{sum(sum(plan.tokens) for plan in plans)} input tokens')
 
-        return doc
+    def _clean_text(self, md_file: Path) -> Element:
+        """Remove code blocks, images, and tables from an article's source text"""
+        return clean_text_tree(parser_render(md_file))
 
-    def _split_text_iter(self, element):        
+    def _split_text_iter(self, element):
         """Split on the `h2` header"""
+        for _, text in split_sections(element):
+            yield text
+
+
+def copy_static_files(ctx: BuildContext):
+    """A variant outside of the docs, or in memory, gets the stylesheets, fonts and images of the site"""
+    ctx.writer.copy_tree(cns.DOCS_FILES_DIR, ctx.path(cns.DOCS_FILES_DIR))
+
+
+def build(articles_dir: Path, contexts: List[BuildContext], subset_fonts=False, figures=False,
+          optimize_images=False, low_memory=False, memory_report=False) -> BuildRecord:
+    """Variants are rendered article by article, the article transforms are computed once per transform flags.
+    The record describes the first variant."""
+    started_at, start = datetime.now(), time.perf_counter()
+    caches = {'thumbnails': CacheStats(), 'summaries': CacheStats()}
+    articles_exports = None  # shared by the variants
+    output_bytes = {}
+    articles_data = {id(ctx): [] for ctx in contexts}
+    built_paths = {id(ctx): set() for ctx in contexts}
+    attached_images = []  # context, source path, output path
+    report = MemoryReport(is_enabled=memory_report)
+
+    if subset_fonts:
+        with report.stage('fonts'):
+            charset = collect_charset(collect_site_texts(articles_dir))
+            font_faces = subset_font_faces(charset, contexts[0].writer)
+            for ctx in contexts:
+                ctx.env.globals['font_faces'] = font_faces
+
+    for ctx in contexts:
+        copy_static_files(ctx)
+
+    figure_outputs = {}
+    if figures:
+        with report.stage('figures'):
+            article_dirs = [md_file.parent for md_file in list_article_md_files(articles_dir)]
+            figure_outputs = regenerate_figures(article_dirs)
+
+    with report.stage('link graph'):
+        link_graphs = {id(ctx): make_link_graph(ctx, articles_dir) if ctx.prefetch else None for ctx in contexts}
+    index_prefetch_links = {id_: link_graph.index_hints() if link_graph else ()
+                            for id_, link_graph in link_graphs.items()}
+
+    with report.stage('articles'):
+        for article_md_file in list_article_md_files(articles_dir, reverse=True):
+            article_source_dir = article_md_file.parent
+            for ctx in contexts:
+                # Generate an article html and write it in a file
+                article_dir = ctx.path(cns.DOCS_ARTICLES_DIR) / article_source_dir.name
+                article_index_file = article_dir / cns.DOCS_INDEX_FILE.name
+                # with aspectlib.weave(HTMLGen,
+                #                      aspectlib.debug.log(print_to=sys.stdout, stacktrace=None),
+                #                      lazy=True):
+                data = HTMLGen.generate_article_html(ctx.env, article_md_file, article_source_dir,
+                                                     font_icons=ctx.font_icons, highlight=ctx.highlight,
+                                                     track_analytics=ctx.track_analytics,
+                                                     link_graph=link_graphs[id(ctx)], math=ctx.math)
+                article_html, toc_html, article_data, files_paths, images = data
+                ctx.writer.write_text(article_index_file, article_html)
+                articles_data[id(ctx)].append(article_data)
+                built_paths[id(ctx)].add(article_index_file)
+
+                # Making hardlinks to attached files
+                # files_paths, images = HTMLGen.retrieve_attached_files_paths(article_html)
+                article_figures = figure_outputs.get(article_source_dir, {})
+                for file_path, content in article_figures.items():
+                    figure_path = article_index_file.parent / file_path
+                    ctx.writer.write_bytes(figure_path, content)
+                    built_paths[id(ctx)].add(figure_path)
+
+                for file_path in chain(files_paths, images.keys()):
+                    if file_path in article_figures:
+                        continue
+                    target_path = article_source_dir / file_path
+                    hardlink_source_path = article_index_file.parent / file_path
+                    if optimize_images and target_path.suffix.lower() in cns.IMAGES_SUFFIXES:
+                        attached_images.append((ctx, target_path, hardlink_source_path))
+                    else:
+                        ctx.writer.link(target_path, hardlink_source_path)
+                    built_paths[id(ctx)].add(hardlink_source_path)
+
+                # Symbol links with human-readable name
+                article_relative_symlink_path = ctx.docs_dir / article_data.relative_link
+                ctx.writer.symlink(article_dir.name, article_relative_symlink_path)
+                built_paths[id(ctx)].add(article_relative_symlink_path)
+
+            if low_memory:
+                # Only `article_data` outlives an iteration, the html and the parsed trees are released
+                del data, article_html, toc_html
+                HTMLGen.transform_article.cache_clear()
+                parser_render.cache_clear()
+                gc.collect()
+
+    # Optimized copies of the attached images instead of the hardlinks
+    if attached_images:
+        with report.stage('images'):
+            optimized = optimize_attached_images({target_path for _, target_path, _ in attached_images})
+            for ctx, target_path, path in attached_images:
+                ctx.writer.write_bytes(path, optimized[target_path])
+
+    for ctx in contexts:
+        ctx_articles_data = articles_data[id(ctx)]
+        variant = '' if ctx is contexts[0] else ctx.docs_dir.name
+
+        # Generate the original index
+        with report.stage('index', variant):
+            index_html = HTMLGen.generate_index_html(ctx.env, ctx_articles_data, IndexViewEnum.default,
+                                                     prefetch_links=index_prefetch_links[id(ctx)])
+            ctx.writer.write_text(ctx.path(cns.DOCS_INDEX_FILE), index_html)
+
+        # Views
+        with report.stage('preview view', variant):
+            pv = PreviewView(ctx, is_enabled=ctx.preview_view, prefetch_links=index_prefetch_links[id(ctx)])
+            pv.create(articles_dir, ctx_articles_data)
+            caches['thumbnails'].merge(pv.cache_stats)
+
+        with report.stage('summary view', variant):
+            sv = SummaryView(ctx, is_enabled=ctx.summary_view, prefetch_links=index_prefetch_links[id(ctx)],
+                             backend=ctx.summary_backend)
+            sv.create(articles_dir, ctx_articles_data)
+            caches['summaries'].merge(sv.cache_stats)
+
+        # Machine-readable content and the retrieval vectors for the services
+        if ctx.export or ctx.vectors:
+            with report.stage('export', variant):
+                if articles_exports is None:
+                    articles_exports = [make_article_export(md_file.parent.name, parser_render(md_file), adata)
+                                        for md_file, adata in zip(list_article_md_files(articles_dir, reverse=True),
+                                                                  ctx_articles_data)]
+                if ctx.export:
+                    export_articles(ctx, articles_exports)
+
+        if ctx.vectors:
+            with report.stage('vectors', variant):
+                export_vectors(ctx, articles_exports)
+
+        # Sitemap, RSS
+        with report.stage('sitemap, rss', variant):
+            sitemap_xml = generate_sitemap(ctx.env, ctx_articles_data)
+            ctx.writer.write_text(ctx.path(cns.SITEMAP_FILE), sitemap_xml)
+
+            rss_xml = generate_rss(ctx.env, ctx_articles_data)
+            ctx.writer.write_text(ctx.path(cns.RSS_FILE), rss_xml)
+
+        # Content hashes of the docs, changes against the previous build
+        with report.stage('manifest', variant):
+            orphans = ctx.writer.find_orphans(built_paths[id(ctx)], ctx.docs_dir)
+            if ctx.prune_orphans:
+                ctx.writer.remove(orphans)
+            else:
+                for orphan in orphans:
+                    print('Orphan: ', orphan.relative_to(ctx.docs_dir))
+
+            manifest = ctx.writer.scan(ctx.docs_dir)
+            if ctx.service_worker:  # revisions of the precached files are taken from the manifest
+                sw_js = generate_service_worker(ctx.env, manifest)
+                ctx.writer.write_text(ctx.path(cns.SERVICE_WORKER_FILE), sw_js)
+                manifest[cns.SERVICE_WORKER_FILE.relative_to(cns.DOCS_DIR).as_posix()] = text_hash(sw_js)
+
+            compare_manifests(ctx.writer.load_manifest(ctx.docs_dir), manifest).print()
+            ctx.writer.write_text(ctx.path(cns.MANIFEST_FILE), dump_manifest(manifest))
+            if ctx is contexts[0]:
+                output_bytes = count_output_bytes(manifest, lambda path: ctx.writer.size(ctx.docs_dir / path))
+
+    report.print()
+    flags = dict(contexts[0].flags, subset_fonts=subset_fonts, figures=figures, optimize_images=optimize_images,
+                 low_memory=low_memory, memory_report=memory_report, variants=len(contexts))
+    return BuildRecord(started_at=started_at, duration=time.perf_counter() - start,
+                       articles_count=len(articles_data[id(contexts[0])]), peak_rss=peak_rss(), flags=flags,
+                       stages=dict(report.durations), caches=caches, output_bytes=output_bytes)
 
-        wrapper_el = Element('div')
-        for sub_elements in split_before(element.iterchildren(), lambda el: el.tag == 'h2'):
-            
-            wrapper_el.extend(sub_elements)
-            yield str(wrapper_el.text_content())  # convert lxml.etree._ElementUnicodeResult
-            wrapper_el.clear()
-            
 
-def main(articles_dir: Path, font_icons=True, highlight=True,
+def main(articles_dir: Path, font_icons=True, highlight=True, math=False,
          track_analytics=cns.TRACK_ANALYTICS,
          analytics=cns.ANALYTICS_ENABLED_DEFAULT,
          monitoring=cns.MONITORING_ENABLED_DEFAULT,
@@ -506,69 +751,60 @@ def main(articles_dir: Path, font_icons=True, highlight=True,
          engqa=cns.ENGQA_ENABLED_DEFAULT,
          statuspage=cns.STATUSPAGE_ENABLED_DEFAULT,
          preview_view=False,
-         summary_view=False):
-    env.globals['track_analytics'] = track_analytics
-    env.globals['analytics_enabled'] = analytics
-    env.globals['monitoring_enabled'] = monitoring
-    env.globals['memocards_enabled'] = memocards
-    env.globals['engqa_enabled'] = engqa
-    env.globals['statuspage_enabled'] = statuspage
-    articles_data = []
-
-
-    for article_md_file in list_article_md_files(articles_dir, reverse=True):
-        # Generate an article html and write it in a file
-        article_source_dir = article_md_file.parent
-        article_dir = cns.DOCS_ARTICLES_DIR / article_source_dir.name
-        article_index_file = article_dir / cns.DOCS_INDEX_FILE.name
-        # with aspectlib.weave(HTMLGen,
-        #                      aspectlib.debug.log(print_to=sys.stdout, stacktrace=None),
-        #                      lazy=True):
-        data = HTMLGen.generate_article_html(article_md_file, article_index_file, article_source_dir,
-                                             font_icons=font_icons, highlight=highlight,
-                                             track_analytics=track_analytics)
-        article_html, toc_html, article_data, files_paths, images = data
-        article_index_file.parent.mkdir(parents=True, exist_ok=True)
-        article_index_file.write_text(article_html)
-        articles_data.append(article_data)
-
-        # Making hardlinks to attached files
-        # files_paths, images = HTMLGen.retrieve_attached_files_paths(article_html)
-        for file_path in chain(files_paths, images.keys()):
-            target_path = article_source_dir / file_path
-            hardlink_source_path = article_index_file.parent / file_path
-            hardlink_source_path.parent.mkdir(parents=True, exist_ok=True)
-            with suppress(FileExistsError):
-                os.link(target_path, hardlink_source_path)
-
-        # Symbol links with human-readable name
-        article_relative_link = article_index_file.relative_to(cns.DOCS_DIR).parent
-        article_relative_symlink_path = Path('..') / cns.DOCS_DIR.name / article_data.relative_link
-        if not article_relative_symlink_path.is_symlink():
-            os.symlink(article_relative_link.name,
-                       article_relative_symlink_path,
-                       target_is_directory=True)
-
-    # Generate the original index
-    index_html = HTMLGen.generate_index_html(articles_data, IndexViewEnum.default)
-    cns.DOCS_INDEX_FILE.write_text(index_html)
-
-    # Views
-    pv = PreviewView(is_enabled=preview_view)
-    pv.create(articles_dir, articles_data)
-
-    sv = SummaryView(is_enabled=summary_view)
-    sv.create(articles_dir, articles_data)
-
-    # Sitemap, RSS
-    sitemap_xml = generate_sitemap(articles_data)
-    cns.SITEMAP_FILE.write_text(sitemap_xml)
-
-    rss_xml = generate_rss(articles_data)
-    cns.RSS_FILE.write_text(rss_xml)
-
-
-if __name__ == '__main__':
+         summary_view=False,
+         summary_backend=cns.SUMMARY_BACKENDS[0],
+         subset_fonts=False,
+         critical_css=False,
+         prune_orphans=False,
+         prefetch=None,
+         prefetch_budget=cns.PREFETCH_BYTES_BUDGET,
+         service_worker=False,
+         export=False,
+         vectors=False,
+         figures=False,
+         optimize_images=False,
+         low_memory=False,
+         memory_report=False,
+         plain_variants_dirs=(),
+         in_memory=False) -> Optional[SiteType]:
+    """With `in_memory` nothing is written to the docs, the generated site is returned by relative paths"""
+    writer = MemoryWriter() if in_memory else DiskWriter()
+    ctx = BuildContext(font_icons=font_icons, highlight=highlight, math=math, track_analytics=track_analytics,
+                       analytics=analytics, monitoring=monitoring, memocards=memocards, engqa=engqa,
+                       statuspage=statuspage, preview_view=preview_view, summary_view=summary_view,
+                       summary_backend=summary_backend, critical_css=critical_css, prune_orphans=prune_orphans,
+                       prefetch=prefetch, prefetch_budget=prefetch_budget, service_worker=service_worker, export=export,
+                       vectors=vectors,
+                       writer=writer)
+    contexts = [ctx] + [ctx.plain(docs_dir) for docs_dir in plain_variants_dirs]
+    record = build(articles_dir, contexts, subset_fonts=subset_fonts, figures=figures,
+                   optimize_images=optimize_images, low_memory=low_memory, memory_report=memory_report)
+    if in_memory:
+        return writer.site(ctx.docs_dir)
+
+    # In-memory builds aren't recorded, they are tests and benchmarks
+    build_history = BuildHistory()
+    build_history.add(record)
+    print(f'Build #{record.id}: {record.duration:.1f}s, {record.articles_count} articles, '
+          f'peak rss {record.peak_rss / 1024 / 1024:.1f} MiB')
+    regression = build_history.check(record)
+    if regression:
+        regression.print()
+
+
+def history(limit=cns.BUILD_HISTORY_LIMIT, stages=False):
+    BuildHistory().print(limit, stages=stages)
+
+
+if __name__ == '__main__' and sys.argv[1:2] == ['history']:
+    parser = ArgumentParser(prog='build.py history', description="Recent builds, trend and regressions.")
+    parser.add_argument('--limit', type=int, default=cns.BUILD_HISTORY_LIMIT, help="Number of the recent builds.")
+    parser.add_argument('--stages', action="store_true", help="Show the per stage durations.")
+    args = parser.parse_args(sys.argv[2:])
+
+    history(limit=args.limit, stages=args.stages)
+
+elif __name__ == '__main__':
     parser = ArgumentParser()
     parser.add_argument('articlesdir', type=Path, help="Path to an articles folder.")
     parser.add_argument('--track-analytics', action="store_true", help="Activate tracking. Write html tags, add css classes. Substitute values from env file. Enable url.")
@@ -579,9 +815,25 @@ if __name__ == '__main__':
     parser.add_argument('--enable-statuspage', action="store_true")
     parser.add_argument('--preview-view', action="store_true")
     parser.add_argument('--summary-view', action="store_true")
+    parser.add_argument('--summary-backend', choices=cns.SUMMARY_BACKENDS, default=cns.SUMMARY_BACKENDS[0], help="Extractive TextRank offline or the LLM.")
+    parser.add_argument('--subset-fonts', action="store_true", help="Subset the fonts to the characters the site uses.")
+    parser.add_argument('--critical-css', action="store_true", help="Inline the css rules a page uses, load the stylesheet asynchronously.")
+    parser.add_argument('--prune', action="store_true", help="Remove the article files and symlinks the build hasn't produced, dangling symlinks.")
+    parser.add_argument('--prefetch', choices=cns.PREFETCH_MODES, help="Hint the next likely pages with speculation rules or prefetch links.")
+    parser.add_argument('--prefetch-budget', type=int, default=cns.PREFETCH_BYTES_BUDGET, help="Max bytes of the hinted pages per page.")
+    parser.add_argument('--service-worker', action="store_true", help="Generate a service worker precaching the app shell and articles.")
+    parser.add_argument('--export', action="store_true", help="Export the articles content as JSON with an index of content hashes.")
+    parser.add_argument('--vectors', action="store_true", help="Embed the articles chunks into the vectors of the retrieval index.")
+    parser.add_argument('--math', action="store_true", help="Render the $inline$ and $$block$$ formulas to static SVG.")
+    parser.add_argument('--figures', action="store_true", help="Regenerate the figures declared by the articles scripts.")
+    parser.add_argument('--optimize-images', action="store_true", help="Recompress the attached images without metadata, downscale the wide ones.")
+    parser.add_argument('--low-memory', action="store_true", help="Release the article html, trees and render caches after each article.")
+    parser.add_argument('--memory-report', action="store_true", help="Print tracemalloc peak and top allocation sites per stage.")
+    parser.add_argument('--plain-variant', type=Path, action="append", default=[], help="Also build a variant without tracking and services into a folder. Repeatable.")
     args = parser.parse_args()
     
     main(args.articlesdir,
+         math=args.math,
          track_analytics=args.track_analytics,
          analytics=args.enable_analytics,
          monitoring=args.enable_monitoring,
@@ -589,4 +841,18 @@ if __name__ == '__main__':
          engqa=args.enable_engqa,
          statuspage=args.enable_statuspage,
          preview_view=args.preview_view,
-         summary_view=args.summary_view)
+         summary_view=args.summary_view,
+         summary_backend=args.summary_backend,
+         subset_fonts=args.subset_fonts,
+         critical_css=args.critical_css,
+         prune_orphans=args.prune,
+         prefetch=args.prefetch,
+         prefetch_budget=args.prefetch_budget,
+         service_worker=args.service_worker,
+         export=args.export,
+         vectors=args.vectors,
+         figures=args.figures,
+         optimize_images=args.optimize_images,
+         low_memory=args.low_memory,
+         memory_report=args.memory_report,
+         plain_variants_dirs=args.plain_variant)
@@ -0,0 +1,86 @@
+import re
+import math
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Iterable, List
+
+from constants import SUMMARY_TOKENIZER_MODEL, SUMMARY_CHUNK_TOKENS
+
+try:
+    import tiktoken
+except ImportError:  # the count is estimated by characters
+    tiktoken = None
+
+
+ASCII_CHARS_PER_TOKEN = 3  # english text is about 4 per token, a non-ASCII character is counted as a token
+PARAGRAPH_RE = re.compile(r'\n+')
+
+
+@lru_cache
+def _encoding():
+    return tiktoken.encoding_for_model(SUMMARY_TOKENIZER_MODEL)
+
+
+def count_tokens(text: str) -> int:
+    if tiktoken is None:  # an overestimate, a chunk fits the budget, cyrillic words are several tokens each
+        ascii_count = len(text.encode('ascii', errors='ignore'))
+        return math.ceil(ascii_count / ASCII_CHARS_PER_TOKEN) + len(text) - ascii_count
+    return len(_encoding().encode(text))
+
+
+@dataclass
+class ChunkPlan:
+    """Chunks of an article, a map call per chunk and a reduce call"""
+    chunks: List[str] = field(default_factory=list)
+    tokens: List[int] = field(default_factory=list)
+
+    @property
+    def calls(self) -> int:
+        return len(self.chunks) + 1 if self.chunks else 0
+
+    def add(self, text: str, tokens: int):
+        self.chunks.append(text)
+        self.tokens.append(tokens)
+
+
+def _split_oversized(text: str, budget: int) -> Iterable[str]:
+    """Paragraph boundaries, words of a paragraph which doesn't fit itself"""
+    for paragraph in filter(str.strip, PARAGRAPH_RE.split(text)):
+        if count_tokens(paragraph) <= budget:
+            yield paragraph
+            continue
+
+        piece, piece_tokens = [], 0
+        for word in paragraph.split(' '):
+            word_tokens = count_tokens(' ' + word)
+            if piece and piece_tokens + word_tokens > budget:
+                yield ' '.join(piece)
+                piece, piece_tokens = [], 0
+            piece.append(word)
+            piece_tokens += word_tokens
+        if piece:
+            yield ' '.join(piece)
+
+
+def plan_chunks(sections: Iterable[str], budget: int = SUMMARY_CHUNK_TOKENS) -> ChunkPlan:
+    """Adjacent small sections are merged, oversized ones are split to fit the budget"""
+    plan = ChunkPlan()
+    pieces = []
+    for section in sections:
+        if count_tokens(section) <= budget:
+            pieces.append(section)
+        else:
+            pieces.extend(_split_oversized(section, budget))
+
+    chunk, chunk_tokens = '', 0
+    for piece in pieces:
+        piece_tokens = count_tokens(piece)
+        if chunk and chunk_tokens + piece_tokens > budget:
+            plan.add(chunk, chunk_tokens)
+            chunk, chunk_tokens = '', 0
+        chunk = chunk + '\n' + piece if chunk else piece
+        chunk_tokens = count_tokens(chunk)
+    if chunk:
+        plan.add(chunk, chunk_tokens)
+
+    return plan
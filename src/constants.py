@@ -10,6 +10,9 @@ DOCS_DIR = PROJ_DIR / 'docs'
 DOCS_ARTICLES_DIR = DOCS_DIR / 'articles'
 DOCS_FILES_DIR = DOCS_DIR / 'files'
 VIEWS_DIR = DOCS_DIR / 'views'
+DOCS_FONTS_DIR = DOCS_FILES_DIR / 'fonts'
+SUBSET_FONTS_DIR = DOCS_FONTS_DIR / 'subset'
+BOOTSTRAP_CSS_FILE = DOCS_FILES_DIR / 'css' / 'bootstrap.min.css'
 TEMPLATES_DIR = BUILD_DIR / 'templates'
 THUMBNAILS_DIR = Path('thumbnails')
 ARTICLE_FILES_DIR = Path('files')
@@ -18,11 +21,68 @@ ARTICLE_TEMPLATE_FILE = TEMPLATES_DIR / 'article.jinja'
 INDEX_TEMPLATE_FILE = TEMPLATES_DIR / 'index.jinja'
 SITEMAP_TEMPLATE_FILE = TEMPLATES_DIR / 'sitemap.jinja'
 RSS_TEMPLATE_FILE = TEMPLATES_DIR / 'rss.jinja'
+SERVICE_WORKER_TEMPLATE_FILE = TEMPLATES_DIR / 'sw.jinja'
 DOCS_INDEX_FILE = DOCS_DIR / 'index.html'
 SITEMAP_FILE = DOCS_DIR / 'sitemap.xml'
 RSS_FILE = DOCS_DIR / 'rss.xml'
+MANIFEST_FILE = DOCS_DIR / 'manifest.json'
+SERVICE_WORKER_FILE = DOCS_DIR / 'sw.js'
+DOCS_EXPORT_DIR = DOCS_DIR / 'export'
+EXPORT_INDEX_FILE = DOCS_EXPORT_DIR / 'index.json'
+VECTORS_DIR = DOCS_EXPORT_DIR / 'vectors'
 ARTICLE_IMG_FILE = ARTICLE_FILES_DIR / 'main-section.png'
 AS_DIRS_IGNORE = ('drafts', )
+PARSER_RENDER_CACHE_SIZE = 64
+MATH_FONT_SIZE = 12  # pt of the rendering, a formula is sized in em
+MATH_BLOCK_SCALE = 1.25
+MEMORY_REPORT_TOP_COUNT = 10
+BUILD_HISTORY_FILE = DISK_CACHE_DIR / 'history.sqlite3'
+BUILD_HISTORY_BASELINE = 20  # recent builds with the same flags
+BUILD_HISTORY_Z_THRESHOLD = 3.0
+BUILD_HISTORY_LIMIT = 20  # builds the `history` command shows
+OUTPUT_PAGE_TYPES = (('article', 'articles/*/index.html'),  # name, docs path pattern, the first match wins
+                     ('attached', 'articles/*'),
+                     ('index', 'index.html'),
+                     ('view', 'views/*/index.html'),
+                     ('thumbnail', 'views/*/thumbnails/*'),
+                     ('static', 'files/*'),
+                     ('export', 'export/*'),
+                     ('feed', '*.xml'),
+                     ('service worker', 'sw.js'))
+UPDATE_CLASSES_CACHE_SIZE = 256
+ARTICLE_CONTENT_CLASSES = (('h1', 'display-5 fw-bold'),  # selector, classes
+                           ('h2', 'display-6'),
+                           ('h2, h3, h4, h5, h6', 'mt-5 mb-3 fw-bold'),
+                           ('div.table-responsive', 'mb-3'),
+                           ('table', 'mb-0'),
+                           ('img', 'd-block mx-auto mw-100 h-100'))
+
+FONT_FACES = (('NML', 'NotoSansMono-Light.woff2'),  # css font-family, file in the fonts dir
+              ('NMR', 'NotoSansMono-Regular.woff2'),
+              ('NMM', 'NotoSansMono-Medium.woff2'),
+              ('NMB', 'NotoSansMono-Bold.woff2'),
+              ('Jetbrains', 'JetBrainsMono-ExtraLight.woff2'))
+PRELOAD_FONT_FAMILIES = ('NMR', 'NMB')
+FONT_UNICODE_RANGES = {'latin': ((0x0000, 0x024F), (0x02B0, 0x02FF), (0x2000, 0x206F), (0x20A0, 0x20CF),
+                                 (0x2100, 0x215F), (0xFEFF, 0xFEFF), (0xFFFD, 0xFFFD)),
+                       'cyrillic': ((0x0400, 0x052F), (0x1C80, 0x1C8F), (0x2DE0, 0x2DFF), (0xA640, 0xA69F))}
+
+CRITICAL_CSS_MARKER = '/* critical-css */'
+CRITICAL_CSS_SAFELIST = ('svg', 'iframe')  # elements scripts create after a page is loaded
+
+SERVICE_WORKER_PRECACHE = ('index.html', 'files/favicon.png', 'files/photo.jpg', 'files/css/*')  # and articles
+
+FIGURES_FILE = Path('figures.json')  # in an article dir
+FIGURES_TIMEOUT = 300  # seconds
+FIGURES_WORKERS = os.cpu_count()
+
+IMAGES_SUFFIXES = ('.png', '.jpg', '.jpeg')  # attached files to optimize
+IMAGES_MAX_WIDTH = 1600  # px, wider images are downscaled
+IMAGES_WORKERS = os.cpu_count()
+
+PREFETCH_MODES = ('speculationrules', 'prefetch')
+PREFETCH_INDEX_COUNT = 3
+PREFETCH_BYTES_BUDGET = 512 * 1024
 
 TRACK_ANALYTICS = False
 ANALYTICS_ENABLED_DEFAULT = False
@@ -46,3 +106,18 @@ STATUSPAGE_SERVICE_ADDRESS = os.environ.get("STATUSPAGE_SERVICE_ADDRESS", "")
 
 OPENAI_KEY_FILE = os.environ.get('OPENAI_KEY_FILE')
 HUGGINGFACE_KEY_FILE = os.environ.get('HUGGINGFACE_KEY_FILE')
+SUMMARY_TOKENIZER_MODEL = 'gpt-3.5-turbo'
+SUMMARY_CHUNK_TOKENS = 3000  # of the 4k context, the rest is the map prompt and the answer
+SUMMARY_BACKENDS = ('textrank', 'llm')
+SUMMARY_SENTENCES_COUNT = 4
+TEXTRANK_DAMPING = 0.85
+TEXTRANK_TOLERANCE = 1e-6
+TEXTRANK_MAX_ITERATIONS = 100
+TEXTRANK_MIN_SENTENCE_WORDS = 4  # headers and captions are shorter
+
+VECTORS_EMBEDDER = 'hashing'
+VECTORS_DIM = 512
+VECTORS_CHUNK_TOKENS = 256
+VECTORS_IVF_MIN_COUNT = 4096  # chunks, a smaller matrix is scanned whole
+VECTORS_IVF_ITERATIONS = 10
+VECTORS_IVF_PROBES = 8  # lists scanned by a query
@@ -0,0 +1,87 @@
+from dataclasses import dataclass, field, fields, replace
+from pathlib import Path
+from typing import Dict, Optional
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+import constants as cns
+from filters import trailing_slash, to_rfc822, prepend_site_address, update_classes
+from fonts import default_font_faces
+from writer import Writer, DiskWriter
+
+
+def make_env() -> Environment:
+    env = Environment(loader=FileSystemLoader(cns.TEMPLATES_DIR.as_posix()), trim_blocks=True,
+                      autoescape=select_autoescape(['html']))
+    env.globals['site_address'] = cns.SITE_ADDRESS
+    env.globals['site_name'] = cns.SITE_NAME
+    env.globals['analytics_service_token'] = cns.ANALYTICS_SERVICE_TOKEN
+    env.globals['analytics_service_js'] = cns.ANALYTICS_SERVICE_JS
+    env.globals['analytics_service_page'] = cns.ANALYTICS_SERVICE_PAGE
+    env.globals['monitoring_service_page'] = cns.MONITORING_SERVICE_PAGE
+    env.globals['memocards_service_address'] = cns.MEMOCARDS_SERVICE_ADDRESS
+    env.globals['engqa_service_address'] = cns.ENGQA_SERVICE_ADDRESS
+    env.globals['statuspage_service_page'] = cns.STATUSPAGE_SERVICE_ADDRESS
+    env.globals['font_faces'] = default_font_faces()
+    env.globals['critical_css_marker'] = cns.CRITICAL_CSS_MARKER
+    env.filters['trailing_slash'] = trailing_slash
+    env.filters['to_rfc822'] = to_rfc822
+    env.filters['prepend_site_address'] = prepend_site_address
+    env.filters['update_classes'] = update_classes
+    env.filters['any'] = any
+    return env
+
+
+@dataclass
+class BuildContext:
+    """A site variant: its flags, Jinja environment, output root and writer.
+    Variants of a run share the markdown/html transforms and fork at rendering."""
+    docs_dir: Path = cns.DOCS_DIR
+    font_icons: bool = True
+    highlight: bool = True
+    math: bool = False
+    track_analytics: bool = cns.TRACK_ANALYTICS
+    analytics: bool = cns.ANALYTICS_ENABLED_DEFAULT
+    monitoring: bool = cns.MONITORING_ENABLED_DEFAULT
+    memocards: bool = cns.MEMOCARDS_ENABLED_DEFAULT
+    engqa: bool = cns.ENGQA_ENABLED_DEFAULT
+    statuspage: bool = cns.STATUSPAGE_ENABLED_DEFAULT
+    preview_view: bool = False
+    summary_view: bool = False
+    summary_backend: str = cns.SUMMARY_BACKENDS[0]
+    critical_css: bool = False
+    prune_orphans: bool = False
+    prefetch: Optional[str] = None
+    prefetch_budget: int = cns.PREFETCH_BYTES_BUDGET
+    service_worker: bool = False
+    export: bool = False
+    vectors: bool = False
+    writer: Writer = field(default_factory=DiskWriter, repr=False)
+    env: Environment = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.env = make_env()
+        self.env.globals['track_analytics'] = self.track_analytics
+        self.env.globals['analytics_enabled'] = self.analytics
+        self.env.globals['monitoring_enabled'] = self.monitoring
+        self.env.globals['memocards_enabled'] = self.memocards
+        self.env.globals['engqa_enabled'] = self.engqa
+        self.env.globals['statuspage_enabled'] = self.statuspage
+        self.env.globals['critical_css'] = self.critical_css
+        self.env.globals['prefetch_mode'] = self.prefetch
+        self.env.globals['service_worker'] = self.service_worker
+        self.env.globals['summary_backend'] = self.summary_backend
+
+    @property
+    def flags(self) -> Dict[str, object]:
+        """Flags changing the output, the output root and the writer aren't"""
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.name not in ('docs_dir', 'writer', 'env')}
+
+    def path(self, docs_path: Path) -> Path:
+        """A docs path of the constants under the variant output root"""
+        return self.docs_dir / docs_path.relative_to(cns.DOCS_DIR)
+
+    def plain(self, docs_dir: Path) -> 'BuildContext':
+        """The variant without tracking and services"""
+        return replace(self, docs_dir=docs_dir, track_analytics=False, analytics=False, monitoring=False,
+                       memocards=False, engqa=False, statuspage=False)
@@ -0,0 +1,139 @@
+import re
+import hashlib
+from contextlib import suppress
+from functools import lru_cache
+from typing import List, Tuple
+
+from cssselect import HTMLTranslator, SelectorError, ExpressionError
+from diskcache import Cache
+from lxml import etree
+from lxml.html import document_fromstring
+
+from constants import DISK_CACHE_DIR, BOOTSTRAP_CSS_FILE, CRITICAL_CSS_MARKER, CRITICAL_CSS_SAFELIST
+
+
+cache = Cache(DISK_CACHE_DIR)
+translator = HTMLTranslator()
+COMMENT_RE = re.compile(r'/\*.*?\*/', re.DOTALL)
+PSEUDO_RE = re.compile(r'::?[a-zA-Z-]+(\([^()]*\))?')
+SAFELIST_RE = re.compile(r'(?<![\w-])(' + '|'.join(map(re.escape, CRITICAL_CSS_SAFELIST)) + r')(?![\w-])')
+BlocksType = List[Tuple[str, str]]
+
+
+def _split_blocks(css: str) -> BlocksType:
+    """Top level `prelude{body}` pairs, at-rule statements like `@charset` are skipped"""
+    blocks = []
+    depth, start, prelude_end, quote = 0, 0, 0, None
+
+    for i, char in enumerate(css):
+        if quote:
+            if char == quote and css[i - 1] != '\\':
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char == '{':
+            if depth == 0:
+                prelude_end = i
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                blocks.append((css[start:prelude_end].strip(), css[prelude_end + 1:i]))
+                start = i + 1
+        elif char == ';' and depth == 0:
+            start = i + 1
+
+    return blocks
+
+
+def _split_selectors(prelude: str) -> List[str]:
+    selectors, depth, start = [], 0, 0
+    for i, char in enumerate(prelude):
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            selectors.append(prelude[start:i])
+            start = i + 1
+    selectors.append(prelude[start:])
+    return [selector.strip() for selector in selectors]
+
+
+@lru_cache(maxsize=None)
+def _compile_selector(selector: str):
+    """Dynamic pseudo-classes and pseudo-elements are dropped if cssselect can't translate them"""
+    for candidate in (selector, PSEUDO_RE.sub('', selector)):
+        with suppress(SelectorError, ExpressionError):
+            return etree.XPath(translator.css_to_xpath(candidate.strip() or '*'))
+
+    return None
+
+
+def _is_matched(prelude: str, doc) -> bool:
+    for selector in _split_selectors(prelude):
+        if SAFELIST_RE.search(selector):  # elements created by scripts at runtime
+            return True
+
+        xpath = _compile_selector(selector)
+        if xpath is None or xpath(doc):  # not translatable rule is kept
+            return True
+
+    return False
+
+
+def _critical_rules(blocks: BlocksType, doc) -> List[str]:
+    rules = []
+    for prelude, body in blocks:
+        if prelude.startswith(('@media', '@supports')):
+            nested_rules = _critical_rules(_split_blocks(body), doc)
+            if nested_rules:
+                rules.append(prelude + '{' + ''.join(nested_rules) + '}')
+        elif prelude.startswith('@'):  # keyframes, font faces are not critical
+            continue
+        elif _is_matched(prelude, doc):
+            rules.append(prelude + '{' + body + '}')
+
+    return rules
+
+
+def _page_signature(doc) -> str:
+    """Tags, classes, ids and attributes a page consists of"""
+    tokens = set()
+    for element in doc.iter(etree.Element):
+        tokens.add(element.tag)
+        tokens.update('.' + class_ for class_ in element.classes)
+        tokens.update('@' + attr for attr in element.attrib if attr != 'class')
+        if element.get('id'):
+            tokens.add('#' + element.get('id'))
+
+    return hashlib.sha1(' '.join(sorted(tokens)).encode()).hexdigest()
+
+
+@lru_cache
+def load_stylesheet() -> Tuple[str, BlocksType]:
+    css = BOOTSTRAP_CSS_FILE.read_text()
+    digest = hashlib.sha1(css.encode()).hexdigest()
+    return digest, _split_blocks(COMMENT_RE.sub('', css))
+
+
+def extract_critical_css(html: str, template_name: str) -> str:
+    css_digest, blocks = load_stylesheet()
+    doc = document_fromstring(html)
+    key = ('critical-css', template_name, css_digest, _page_signature(doc))
+
+    critical_css = cache.get(key)
+    if critical_css is None:
+        critical_css = ''.join(_critical_rules(blocks, doc))
+        cache.set(key, critical_css)
+
+    return critical_css
+
+
+def inline_critical_css(html: str, template_name: str) -> str:
+    """Substitute the marker a template leaves in the `<head>` with the critical rules"""
+    if CRITICAL_CSS_MARKER not in html:
+        return html
+
+    critical_css = extract_critical_css(html, template_name)
+    return html.replace(CRITICAL_CSS_MARKER, critical_css, 1)
@@ -0,0 +1,87 @@
+import json
+import hashlib
+from itertools import chain
+from typing import Iterator, List, Tuple
+
+from lxml.html import Element, fromstring
+from more_itertools import split_before
+
+from constants import DOCS_EXPORT_DIR, EXPORT_INDEX_FILE
+from context import BuildContext
+from filters import trailing_slash
+
+
+def clean_text_tree(html: str) -> Element:
+    """Remove code blocks, images, and tables from an article's source text"""
+
+    doc = fromstring(html)
+    remove_exprs = ['.//pre[code]', './/table', './/img']
+    findall = lambda doc, xpath_list: chain(*(doc.findall(xpath) for xpath in xpath_list))
+
+    remove_elements = findall(doc, remove_exprs)
+    for element in remove_elements:
+        try:
+            doc.remove(element)
+        except ValueError as e:
+            # error `Element is not a child of this node` more likely refers to an already removed element.
+            print(e)
+
+    return doc
+
+
+def split_sections(element: Element) -> Iterator[Tuple[str, str]]:
+    """Split on the `h2` header, a section before the first one has an empty title"""
+
+    for sub_elements in split_before(element.iterchildren(), lambda el: el.tag == 'h2'):
+        title = sub_elements[0].text_content().strip() if sub_elements[0].tag == 'h2' else ''
+        text = ''.join(chain.from_iterable((el.text_content(), el.tail or '') for el in sub_elements))
+        yield title, str(text)  # convert lxml.etree._ElementUnicodeResult
+
+
+def _code_blocks(html: str) -> List[dict]:
+    code_blocks = []
+    for code in fromstring(html).findall('.//pre/code'):
+        language = next((cls[len('language-'):] for cls in code.classes if cls.startswith('language-')), '')
+        code_blocks.append({'language': language, 'code': code.text_content()})
+    return code_blocks
+
+
+def make_article_export(article_id: str, md_html: str, article_data) -> dict:
+    """`md_html` is a rendered markdown before the article passes"""
+    sections = [{'title': title, 'text': text} for title, text in split_sections(clean_text_tree(md_html))]
+    return {'id': article_id,
+            'title': article_data.title,
+            'date': article_data.created_date.date().isoformat(),
+            'link': '/' + trailing_slash(article_data.relative_link),
+            'description': article_data.paragraph,
+            'cover': '/' + article_data.main_img_relative_link.as_posix(),
+            'sections': sections,
+            'text': ''.join(section['text'] for section in sections),
+            'code_blocks': _code_blocks(md_html),
+            'images': [{'title': image.title, 'link': '/' + image.relative_link.as_posix()}
+                       for image in article_data.images]}
+
+
+def dumps(data) -> str:
+    """Stable between builds, a content hash changes with the content only"""
+    return json.dumps(data, ensure_ascii=False, indent=1, sort_keys=True) + '\n'
+
+
+def export_articles(ctx: BuildContext, articles_exports: List[dict]):
+    """A JSON per article and the index of their hashes, consumers fetch the changed ones"""
+    export_articles_dir = ctx.path(DOCS_EXPORT_DIR) / 'articles'
+    index, export_files = [], set()
+    for article_export in articles_exports:
+        export_file = export_articles_dir / f'{article_export["id"]}.json'
+        text = dumps(article_export)
+        ctx.writer.write_text(export_file, text)
+        export_files.add(export_file)
+        index.append({'id': article_export['id'],
+                      'title': article_export['title'],
+                      'date': article_export['date'],
+                      'link': article_export['link'],
+                      'path': export_file.relative_to(ctx.path(DOCS_EXPORT_DIR)).as_posix(),
+                      'hash': hashlib.sha1(text.encode()).hexdigest()})
+
+    ctx.writer.remove(sorted(set(ctx.writer.iterdir(export_articles_dir)) - export_files))
+    ctx.writer.write_text(ctx.path(EXPORT_INDEX_FILE), dumps({'articles': index}))
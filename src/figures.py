@@ -0,0 +1,115 @@
+import os
+import sys
+import json
+import shutil
+import hashlib
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Dict, List, Optional
+
+from diskcache import Cache
+
+from constants import DISK_CACHE_DIR, FIGURES_FILE, FIGURES_TIMEOUT, FIGURES_WORKERS
+
+
+cache = Cache(DISK_CACHE_DIR)
+
+
+@dataclass
+class FigureScript:
+    """Paths are relative to an article dir, a script runs in its own dir.
+    Declared in the `figures.json` of an article:
+    [{"script": "files/chart.py", "inputs": ["files/data.txt"], "outputs": ["files/chart.png"]}]
+    """
+    article_dir: Path
+    script: str
+    outputs: List[str]
+    inputs: List[str] = field(default_factory=list)
+
+    @property
+    def key(self) -> str:
+        """Changes with the script, its input data files, the declared outputs"""
+        digest = hashlib.sha1()
+        for relative_path in [self.script] + sorted(self.inputs):
+            digest.update(relative_path.encode())
+            digest.update((self.article_dir / relative_path).read_bytes())
+        digest.update(json.dumps(sorted(self.outputs)).encode())
+        return 'figure-' + digest.hexdigest()
+
+
+def discover_figure_scripts(article_dir: Path) -> List[FigureScript]:
+    declaration_file = article_dir / FIGURES_FILE
+    if not declaration_file.exists():
+        return []
+
+    try:
+        return [FigureScript(article_dir=article_dir, **declaration)
+                for declaration in json.loads(declaration_file.read_text())]
+    except (ValueError, TypeError) as e:  # not a JSON list of the declarations, unknown or missing keys
+        print('Figure script is skipped ', declaration_file, e)
+        return []
+
+
+def _run(figure: FigureScript) -> Optional[Dict[str, bytes]]:
+    """Run a script headless in a temporary copy of the declared files"""
+    with TemporaryDirectory() as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        for relative_path in [figure.script] + figure.inputs:
+            (tmp_dir / relative_path).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(figure.article_dir / relative_path, tmp_dir / relative_path)
+
+        script_path = tmp_dir / figure.script
+        env = dict(os.environ, MPLBACKEND='Agg')
+        try:
+            subprocess.run([sys.executable, script_path.name], cwd=script_path.parent, env=env,
+                           timeout=FIGURES_TIMEOUT, capture_output=True, check=True)
+        except subprocess.TimeoutExpired:
+            print('Figure script timed out ', figure.article_dir / figure.script)
+            return None
+        except subprocess.CalledProcessError as e:
+            print('Figure script failed ', figure.article_dir / figure.script, e.stderr.decode())
+            return None
+
+        outputs = {}
+        for relative_path in figure.outputs:
+            output_path = tmp_dir / relative_path
+            if not output_path.exists():
+                print('Figure is not created ', figure.article_dir / relative_path)
+                return None
+            outputs[relative_path] = output_path.read_bytes()
+
+        return outputs
+
+
+def _regenerate(figure: FigureScript) -> Dict[str, bytes]:
+    try:
+        key = figure.key
+    except OSError as e:
+        print('Figure script is skipped ', figure.article_dir / figure.script, e)
+        return {}
+
+    outputs = cache.get(key)
+    if outputs is None:
+        outputs = _run(figure)
+        if outputs is None:
+            return {}
+        cache.set(key, outputs)
+
+    return outputs
+
+
+def regenerate_figures(article_dirs: List[Path]) -> Dict[Path, Dict[str, bytes]]:
+    """Contents of the figure scripts outputs per article, unchanged scripts are never re-run.
+    The articles sources are left intact, a build writes the outputs."""
+    figures = [figure for article_dir in article_dirs for figure in discover_figure_scripts(article_dir)]
+    with ThreadPoolExecutor(max_workers=FIGURES_WORKERS) as executor:
+        results = executor.map(_regenerate, figures)
+
+    article_outputs = {article_dir: {} for article_dir in article_dirs}
+    for figure, outputs in zip(figures, results):
+        article_outputs[figure.article_dir].update(outputs)
+
+    return article_outputs
@@ -1,13 +1,20 @@
+import hashlib
+from collections import OrderedDict
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import Union
+from typing import Iterable, Tuple, Union
 
+from lxml.cssselect import CSSSelector
 from lxml.html import fromstring, tostring
 
-from constants import SITE_ADDRESS
+from constants import SITE_ADDRESS, UPDATE_CLASSES_CACHE_SIZE
 from utils import wrap_unwrap_fake_tag
 
 
+update_classes_cache = OrderedDict()
+
+
 def trailing_slash(link: Union[Path, str]) -> str:
     if isinstance(link, Path):
         link = link.as_posix()
@@ -25,12 +32,34 @@ def prepend_site_address(link: Union[Path, str]) -> str:
     return SITE_ADDRESS + '/' + link
 
 
+@lru_cache(maxsize=None)
+def compile_selector(selector: str) -> CSSSelector:
+    """Translated to XPath and compiled once per selector"""
+    return CSSSelector(selector)
+
+
+def apply_classes(root_element, rules: Iterable[Tuple[str, str]]):
+    """Tree pass, the elements matched by a selector get the classes"""
+    for selector, classes in rules:
+        classes = classes.split(' ')
+        for element in compile_selector(selector)(root_element):
+            element.classes.update(classes)
+
+
 def update_classes(html: str, selector: str , classes: str) -> str:
+    """String filter over `apply_classes`, results are memoized by the html hash, selector and classes"""
+    key = (hashlib.sha1(html.encode()).hexdigest(), selector, classes)
+    if key in update_classes_cache:
+        update_classes_cache.move_to_end(key)
+        return update_classes_cache[key]
+
     doc = fromstring(wrap_unwrap_fake_tag(html))
-    classes = classes.split(' ')
-    for t in doc.cssselect(selector):
-        t.classes.update(classes)
+    apply_classes(doc, [(selector, classes)])
+
+    updated_html = tostring(doc, encoding='unicode')
+    updated_html = wrap_unwrap_fake_tag(updated_html, wrap=False)
 
-    html = tostring(doc, encoding='unicode')
-    html = wrap_unwrap_fake_tag(html, wrap=False)
-    return html
+    update_classes_cache[key] = updated_html
+    if len(update_classes_cache) > UPDATE_CLASSES_CACHE_SIZE:
+        update_classes_cache.popitem(last=False)
+    return updated_html
@@ -0,0 +1,114 @@
+import io
+import hashlib
+import string
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Set, Tuple
+
+from diskcache import Cache
+from fontTools import subset
+
+from constants import (DISK_CACHE_DIR, DOCS_DIR, DOCS_FONTS_DIR, SUBSET_FONTS_DIR, FONT_FACES,
+                       PRELOAD_FONT_FAMILIES, FONT_UNICODE_RANGES)
+from writer import Writer
+
+
+cache = Cache(DISK_CACHE_DIR)
+BASE_CHARSET = set(string.printable) - set(string.whitespace) | {' '}  # text added after the subsetting, llm summaries
+
+
+@dataclass
+class FontFace:
+    family: str
+    link: str
+    unicode_range: str = ''
+    preload: bool = False
+
+
+def _make_link(path: Path) -> str:
+    return '/' + path.relative_to(DOCS_DIR).as_posix()
+
+
+def _to_unicode_range(codepoints: Iterable[int]) -> str:
+    """Collapse sorted code points into the css `unicode-range` descriptor"""
+    ranges: List[Tuple[int, int]] = []
+    for cp in sorted(codepoints):
+        if ranges and ranges[-1][1] + 1 == cp:
+            ranges[-1] = (ranges[-1][0], cp)
+        else:
+            ranges.append((cp, cp))
+
+    return ', '.join(f'U+{start:X}' if start == end else f'U+{start:X}-{end:X}'
+                     for start, end in ranges)
+
+
+def _split_charset(charset: Set[str]) -> dict:
+    """Group the characters by the unicode ranges, the rest is a separate group"""
+    groups = {group: set() for group in FONT_UNICODE_RANGES}
+    groups['other'] = set()
+
+    for char in charset:
+        cp = ord(char)
+        for group, ranges in FONT_UNICODE_RANGES.items():
+            if any(start <= cp <= end for start, end in ranges):
+                groups[group].add(cp)
+                break
+        else:
+            groups['other'].add(cp)
+
+    return {group: cps for group, cps in groups.items() if cps}
+
+
+def collect_charset(texts: Iterable[str]) -> Set[str]:
+    charset = set(BASE_CHARSET)
+    for text in texts:
+        charset.update(text)
+    return {char for char in charset if char.isprintable()}
+
+
+@cache.memoize()
+def subset_font(font_path: Path, font_digest: str, text: str) -> bytes:
+    """`font_digest` invalidates the cached subset when a font file is replaced"""
+    options = subset.Options()
+    options.flavor = 'woff2'
+    options.layout_features = ['*']
+    font = subset.load_font(font_path.as_posix(), options)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(text=text)
+    subsetter.subset(font)
+
+    buffer = io.BytesIO()
+    subset.save_font(font, buffer, options)
+    return buffer.getvalue()
+
+
+def default_font_faces() -> List[FontFace]:
+    """Full font files, nothing is subsetted"""
+    return [FontFace(family=family, link=_make_link(DOCS_FONTS_DIR / font_file),
+                     preload=family in PRELOAD_FONT_FAMILIES)
+            for family, font_file in FONT_FACES]
+
+
+def subset_font_faces(charset: Set[str], writer: Writer) -> List[FontFace]:
+    """Subset every font to the used characters, one file per unicode range group"""
+    faces, subset_files = [], set()
+
+    for family, font_file in FONT_FACES:
+        font_path = DOCS_FONTS_DIR / font_file
+        font_digest = hashlib.sha1(font_path.read_bytes()).hexdigest()
+
+        for group, codepoints in _split_charset(charset).items():
+            text = ''.join(map(chr, sorted(codepoints)))
+            charset_digest = hashlib.sha1((font_digest + text).encode()).hexdigest()[:10]
+            subset_file = SUBSET_FONTS_DIR / f'{font_path.stem}-{group}-{charset_digest}.woff2'
+            if not writer.exists(subset_file):
+                writer.write_bytes(subset_file, subset_font(font_path, font_digest, text))
+            subset_files.add(subset_file)
+
+            faces.append(FontFace(family=family, link=_make_link(subset_file),
+                                  unicode_range=_to_unicode_range(codepoints),
+                                  preload=family in PRELOAD_FONT_FAMILIES and group != 'other'))
+
+    writer.remove(sorted(set(writer.iterdir(SUBSET_FONTS_DIR)) - subset_files))
+
+    return faces
@@ -0,0 +1,85 @@
+import re
+import html
+import hashlib
+from io import BytesIO
+from typing import Optional
+
+from diskcache import Cache
+from lxml import etree
+
+from constants import DISK_CACHE_DIR, MATH_FONT_SIZE, MATH_BLOCK_SCALE
+
+
+cache = Cache(DISK_CACHE_DIR)
+# `dollarmath` renders a formula as `<span class="math inline">` or `<div class="math block">`
+MATH_ELEMENT_RE = re.compile(r'<(span|div) class="math (inline|block)">(.*?)</\1>', re.DOTALL)
+SVG_NS = 'http://www.w3.org/2000/svg'
+XLINK_HREF = '{http://www.w3.org/1999/xlink}href'
+
+
+def _render(tex: str, key: str) -> Optional[str]:
+    """Glyphs as paths, no fonts are loaded by a page. Sizes are in `em`, a formula follows the text size,
+    the box is known before the page is painted."""
+    import matplotlib  # heavy, a build without formulas doesn't need it
+    from matplotlib.figure import Figure
+    from matplotlib.font_manager import FontProperties
+    from matplotlib.mathtext import MathTextParser
+
+    prop = FontProperties(size=MATH_FONT_SIZE)
+    try:
+        width, height, depth, _, _ = MathTextParser('path').parse(f'${tex}$', dpi=72, prop=prop)
+    except ValueError as e:
+        print('Formula is not rendered ', tex, e)
+        return None
+
+    figure = Figure(figsize=(width / 72, height / 72))
+    figure.text(0, depth / height, f'${tex}$', fontproperties=prop, color='black')
+    buffer = BytesIO()
+    with matplotlib.rc_context({'svg.hashsalt': key, 'svg.fonttype': 'path'}):
+        figure.savefig(buffer, format='svg', dpi=72, transparent=True, metadata={'Date': None, 'Creator': None})
+
+    svg = etree.fromstring(buffer.getvalue())
+    for element in svg.findall(f'{{{SVG_NS}}}metadata'):
+        svg.remove(element)
+    for element in list(svg.iter(f'{{{SVG_NS}}}style')):  # a global `*` rule would restyle the whole page
+        defs = element.getparent()
+        defs.remove(element)
+        if len(defs) == 0 and defs.getparent() is not None:
+            defs.getparent().remove(defs)
+    for element in svg.iter(f'{{{SVG_NS}}}*'):  # ids are unique on a page with many formulas
+        if 'id' in element.attrib:
+            element.attrib['id'] = f'{key}-{element.attrib["id"]}'
+        if element.attrib.get(XLINK_HREF, '').startswith('#'):
+            element.attrib[XLINK_HREF] = f'#{key}-{element.attrib[XLINK_HREF][1:]}'
+
+    svg.attrib.update({'width': f'{width / MATH_FONT_SIZE:.3f}em', 'height': f'{height / MATH_FONT_SIZE:.3f}em',
+                       'style': f'vertical-align: {-depth / MATH_FONT_SIZE:.3f}em', 'role': 'img',
+                       'aria-label': tex, 'fill': 'currentColor'})  # the text colour
+    svg_text = etree.tostring(svg, encoding='unicode')
+    return svg_text.replace('#000000', 'currentColor')
+
+
+def render_svg(tex: str) -> Optional[str]:
+    """Cached by the formula source hash, a failed formula as well"""
+    key = 'f' + hashlib.sha1(f'{MATH_FONT_SIZE}:{tex}'.encode()).hexdigest()[:10]
+    svg = cache.get('formula-' + key)
+    if svg is None:
+        svg = _render(tex, key) or ''
+        cache.set('formula-' + key, svg)
+    return svg or None
+
+
+def _replace(match: re.Match) -> str:
+    tag, mode, tex = match.groups()
+    svg = render_svg(html.unescape(tex).strip())
+    if svg is None:
+        return match.group(0)
+
+    if mode == 'block':
+        return f'<div class="math block text-center my-3" style="font-size: {MATH_BLOCK_SCALE}em">{svg}</div>'
+    return f'<span class="math inline">{svg}</span>'
+
+
+def apply_math(html_text: str) -> str:
+    """Static SVG instead of the formulas sources, the last pass, the markup isn't parsed after it"""
+    return MATH_ELEMENT_RE.sub(_replace, html_text)
@@ -0,0 +1,166 @@
+import json
+import sqlite3
+import resource
+import statistics
+from datetime import datetime
+from dataclasses import dataclass, field, asdict
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from constants import BUILD_HISTORY_FILE, BUILD_HISTORY_BASELINE, BUILD_HISTORY_Z_THRESHOLD, OUTPUT_PAGE_TYPES
+from manifest import ManifestType
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+
+    def add(self, is_hit: bool):
+        if is_hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def merge(self, other: 'CacheStats'):
+        self.hits += other.hits
+        self.misses += other.misses
+
+    @property
+    def rate(self) -> Optional[float]:
+        total = self.hits + self.misses
+        return self.hits / total if total else None
+
+
+@dataclass
+class BuildRecord:
+    started_at: datetime
+    duration: float  # seconds
+    articles_count: int
+    peak_rss: int  # bytes
+    flags: Dict[str, object]
+    stages: Dict[str, float] = field(default_factory=dict)  # seconds
+    caches: Dict[str, CacheStats] = field(default_factory=dict)
+    output_bytes: Dict[str, int] = field(default_factory=dict)  # by page type
+    id: Optional[int] = None
+
+    @property
+    def flags_key(self) -> str:
+        """Builds are comparable with the same flags only"""
+        return json.dumps(self.flags, sort_keys=True, default=str)
+
+
+def peak_rss() -> int:
+    """Of the build process, the pools workers aren't counted"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # KiB on linux
+
+
+def page_type(relative_path: str) -> str:
+    return next((name for name, pattern in OUTPUT_PAGE_TYPES if fnmatch(relative_path, pattern)), 'other')
+
+
+def count_output_bytes(manifest: ManifestType, size: Callable[[str], int]) -> Dict[str, int]:
+    """Sizes of the manifest files by page type, `size` takes a relative path"""
+    output_bytes = {}
+    for relative_path, content_hash in manifest.items():
+        if not content_hash.startswith('symlink:'):
+            name = page_type(relative_path)
+            output_bytes[name] = output_bytes.get(name, 0) + size(relative_path)
+    return output_bytes
+
+
+@dataclass
+class Regression:
+    record: BuildRecord
+    baseline_mean: float
+    baseline_count: int
+    z_score: float
+
+    def print(self):
+        print(f'Slow build #{self.record.id}: {self.record.duration:.1f}s against {self.baseline_mean:.1f}s '
+              f'of {self.baseline_count} builds, z-score {self.z_score:.1f}')
+
+
+class BuildHistory:
+    """Records of the builds in SQLite, the per stage, cache and output values are kept as JSON"""
+
+    def __init__(self, db_file: Path = BUILD_HISTORY_FILE):
+        db_file.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(db_file)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS builds ('
+                                'id INTEGER PRIMARY KEY, started_at TEXT, duration REAL, articles_count INTEGER, '
+                                'peak_rss INTEGER, flags TEXT, stages TEXT, caches TEXT, output_bytes TEXT)')
+
+    def add(self, record: BuildRecord) -> BuildRecord:
+        with self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO builds (started_at, duration, articles_count, peak_rss, flags, stages, caches, '
+                'output_bytes) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (record.started_at.isoformat(), record.duration, record.articles_count, record.peak_rss,
+                 record.flags_key, json.dumps(record.stages),
+                 json.dumps({name: asdict(stats) for name, stats in record.caches.items()}),
+                 json.dumps(record.output_bytes)))
+        record.id = cursor.lastrowid
+        return record
+
+    def records(self, limit: Optional[int] = None) -> List[BuildRecord]:
+        """The oldest first"""
+        rows = self.connection.execute('SELECT id, started_at, duration, articles_count, peak_rss, flags, stages, '
+                                       'caches, output_bytes FROM builds ORDER BY id DESC LIMIT ?',
+                                       (limit or -1,)).fetchall()
+        return [BuildRecord(id=id_, started_at=datetime.fromisoformat(started_at), duration=duration,
+                            articles_count=articles_count, peak_rss=peak_rss_, flags=json.loads(flags),
+                            stages=json.loads(stages),
+                            caches={name: CacheStats(**stats) for name, stats in json.loads(caches).items()},
+                            output_bytes=json.loads(output_bytes))
+                for id_, started_at, duration, articles_count, peak_rss_, flags, stages, caches, output_bytes
+                in reversed(rows)]
+
+    def find_regression(self, record: BuildRecord, previous: List[BuildRecord]) -> Optional[Regression]:
+        """A z-score of the duration against the recent builds with the same flags"""
+        baseline = [r.duration for r in previous if r.flags_key == record.flags_key][-BUILD_HISTORY_BASELINE:]
+        if len(baseline) < 3:
+            return None
+
+        mean, stdev = statistics.mean(baseline), statistics.stdev(baseline)
+        if not stdev:
+            return None
+
+        z_score = (record.duration - mean) / stdev
+        if z_score < BUILD_HISTORY_Z_THRESHOLD:
+            return None
+        return Regression(record=record, baseline_mean=mean, baseline_count=len(baseline), z_score=z_score)
+
+    def check(self, record: BuildRecord) -> Optional[Regression]:
+        previous = [r for r in self.records(limit=BUILD_HISTORY_BASELINE * 10) if r.id != record.id]
+        return self.find_regression(record, previous)
+
+    def print(self, limit: int, stages: bool = False):
+        """Recent builds, a mark `!` is a regression against the builds before it"""
+        all_records = self.records()
+        records = all_records[-limit:]
+        stage_names = sorted({name for record in records for name in record.stages}) if stages else []
+
+        header = f'{"#":>5} {"started at":19} {"total, s":>9} {"articles":>8} {"rss, MiB":>9} {"output, KiB":>11}'
+        print(header + ''.join(f' {name[:12]:>12}' for name in stage_names))
+        for record in records:
+            previous = all_records[:all_records.index(record)]
+            mark = '!' if self.find_regression(record, previous) else ' '
+            line = (f'{record.id:>5} {record.started_at:%Y-%m-%d %H:%M:%S} {record.duration:>8.1f}{mark} '
+                    f'{record.articles_count:>8} {record.peak_rss / 1024 / 1024:>9.1f} '
+                    f'{sum(record.output_bytes.values()) / 1024:>11.1f}')
+            print(line + ''.join(f' {record.stages.get(name, 0):>12.2f}' for name in stage_names))
+
+        if len(records) >= 2:
+            durations = [record.duration for record in records]
+            slope = statistics.linear_regression(range(len(durations)), durations).slope
+            print(f'Trend: {slope:+.2f}s per build over {len(records)} builds')
+
+        if records:
+            last = records[-1]
+            for name, stats in last.caches.items():
+                if stats.rate is not None:
+                    print(f'Cache {name}: {stats.rate:.0%} hits of {stats.hits + stats.misses}')
+            for name, size in sorted(last.output_bytes.items()):
+                print(f'Output {name}: {size / 1024:.1f} KiB')
@@ -0,0 +1,144 @@
+import zlib
+import struct
+import hashlib
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable
+
+from PIL import Image, ImageChops, ImageOps
+from diskcache import Cache
+
+from constants import DISK_CACHE_DIR, IMAGES_MAX_WIDTH, IMAGES_WORKERS
+
+
+cache = Cache(DISK_CACHE_DIR)
+ORIENTATION_TAG = 0x0112
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_METADATA_CHUNKS = {b'tEXt', b'zTXt', b'iTXt', b'tIME', b'eXIf'}
+CACHE_VERSION = 3  # changes with the optimization, the results of the previous one are recomputed
+
+
+def _to_palette(im: Image.Image) -> Image.Image:
+    """The exact palette of an RGB image with 256 colours at most, the image itself otherwise.
+    Other modes are skipped: a P image has a palette already, the quantization drops the alpha of RGBA and LA."""
+    if im.mode != 'RGB' or im.getcolors(256) is None:
+        return im
+
+    palette_im = Image.new('P', (1, 1))
+    palette_im.putpalette([channel for _, color in im.getcolors(256) for channel in color])
+    quantized = im.quantize(palette=palette_im, dither=Image.Dither.NONE)
+    if ImageChops.difference(quantized.convert('RGB'), im).getbbox() is not None:
+        return im
+    return quantized
+
+
+def _orientation_exif(orientation: int) -> bytes:
+    """A TIFF header with the orientation tag only, the rest of EXIF (camera, GPS, dates) isn't kept"""
+    exif = Image.Exif()
+    exif[ORIENTATION_TAG] = orientation
+    return exif.tobytes()[len(b'Exif\x00\x00'):]
+
+
+def _strip_jpeg_metadata(content: bytes, orientation: int) -> bytes:
+    """Segments before the scan are copied but EXIF, XMP, IPTC and comments, the entropy coded data is
+    untouched. JFIF, the ICC profile and the Adobe colour transform are kept, the orientation is rewritten."""
+    segments, i = [content[:2]], 2  # SOI
+    while i < len(content) - 1:
+        while content[i + 1] == 0xFF:  # fill bytes
+            i += 1
+        marker = content[i + 1]
+        if marker == 0xDA:  # start of scan, the rest is the image data
+            segments.append(content[i:])
+            break
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01:  # no length
+            segments.append(content[i:i + 2])
+            i += 2
+            continue
+
+        length = struct.unpack('>H', content[i + 2:i + 4])[0]
+        segment, i = content[i:i + 2 + length], i + 2 + length
+        is_metadata = (0xE1 <= marker <= 0xEF or marker == 0xFE) and not (
+            (marker == 0xE2 and segment[4:].startswith(b'ICC_PROFILE\x00')) or
+            (marker == 0xEE and segment[4:].startswith(b'Adobe')))
+        if not is_metadata:
+            segments.append(segment)
+
+    if orientation != 1:  # after JFIF, that must follow SOI
+        app1 = b'Exif\x00\x00' + _orientation_exif(orientation)
+        position = 2 if segments[1][1] == 0xE0 else 1
+        segments.insert(position, b'\xff\xe1' + struct.pack('>H', len(app1) + 2) + app1)
+    return b''.join(segments)
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+
+def _strip_png_metadata(content: bytes, orientation: int) -> bytes:
+    """Chunks are copied but the texts, time and EXIF, the orientation is rewritten after the header"""
+    chunks, i = [content[:len(PNG_SIGNATURE)]], len(PNG_SIGNATURE)
+    while i < len(content):
+        length = struct.unpack('>I', content[i:i + 4])[0]
+        chunk_type, chunk = content[i + 4:i + 8], content[i:i + 12 + length]
+        i += 12 + length
+        if chunk_type not in PNG_METADATA_CHUNKS:
+            chunks.append(chunk)
+        if chunk_type == b'IHDR' and orientation != 1:
+            chunks.append(_png_chunk(b'eXIf', _orientation_exif(orientation)))
+
+    return b''.join(chunks)
+
+
+def optimize_image(content: bytes) -> bytes:
+    """Drop the metadata, recompress a PNG, downscale above the max width, the smaller content wins.
+    The colour profile is kept, the EXIF orientation is applied to the pixels of a recompressed image
+    and kept by a stripped one. A JPEG is re-encoded only when it's downscaled, its metadata is stripped
+    losslessly otherwise. Animated images are left as they are, saving keeps the first frame only."""
+    im = Image.open(BytesIO(content))
+    image_format, icc_profile = im.format, im.info.get('icc_profile')
+    if image_format not in ('PNG', 'JPEG') or getattr(im, 'n_frames', 1) > 1:
+        return content
+
+    orientation = im.getexif().get(ORIENTATION_TAG, 1)
+    strip_metadata = _strip_jpeg_metadata if image_format == 'JPEG' else _strip_png_metadata
+    stripped = strip_metadata(content, orientation)
+
+    im = ImageOps.exif_transpose(im)
+    is_downscaled = im.width > IMAGES_MAX_WIDTH
+    if image_format == 'JPEG' and not is_downscaled:
+        return stripped
+
+    if is_downscaled:
+        height = round(im.height * IMAGES_MAX_WIDTH / im.width)
+        im = im.resize((IMAGES_MAX_WIDTH, height), Image.LANCZOS)
+
+    buffer = BytesIO()
+    if image_format == 'PNG':
+        if 'transparency' not in im.info:
+            im = _to_palette(im)
+        im.save(buffer, format='PNG', optimize=True, icc_profile=icc_profile)
+    else:
+        im.save(buffer, format='JPEG', quality=95, optimize=True, progressive=True, icc_profile=icc_profile)
+
+    optimized = buffer.getvalue()
+    return optimized if len(optimized) < len(stripped) else stripped
+
+
+def optimize_attached_images(paths: Iterable[Path]) -> Dict[Path, bytes]:
+    """Optimized contents by source paths, cached by a content hash and settings"""
+    contents = {path: path.read_bytes() for path in paths}
+    keys = {path: f'image-{CACHE_VERSION}-{IMAGES_MAX_WIDTH}-' + hashlib.sha1(content).hexdigest()
+            for path, content in contents.items()}
+
+    optimized = {path: cache.get(key) for path, key in keys.items()}
+    misses = [path for path, content in optimized.items() if content is None]
+    with ProcessPoolExecutor(max_workers=IMAGES_WORKERS) as executor:
+        for path, content in zip(misses, executor.map(optimize_image, (contents[path] for path in misses))):
+            cache.set(keys[path], content)
+            optimized[path] = content
+
+    for path in misses:
+        print(f'Image optimized {len(contents[path])} -> {len(optimized[path])} bytes', path)
+
+    return optimized
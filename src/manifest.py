@@ -0,0 +1,102 @@
+import os
+import json
+import shutil
+import hashlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Set
+
+from constants import DOCS_DIR, DOCS_ARTICLES_DIR, MANIFEST_FILE
+
+
+ManifestType = Dict[str, str]  # relative path: content hash or symlink target
+
+
+@dataclass
+class ManifestChanges:
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+
+    def print(self):
+        for title, paths in (('Added', self.added), ('Changed', self.changed), ('Removed', self.removed)):
+            print(f'{title}: {len(paths)}')
+            for path in paths:
+                print('   ', path)
+
+
+def _file_hash(path: Path) -> str:
+    digest = hashlib.sha1()
+    with path.open('rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def scan_docs(docs_dir: Path = DOCS_DIR) -> ManifestType:
+    """Hash every file, symlinks are recorded by a target and not followed"""
+    manifest = {}
+    for dir_path, dir_names, file_names in os.walk(docs_dir):
+        dir_path = Path(dir_path)
+        for name in sorted(dir_names + file_names):
+            path = dir_path / name
+            relative_path = path.relative_to(docs_dir).as_posix()
+            if path.is_symlink():
+                manifest[relative_path] = 'symlink:' + os.readlink(path)
+            elif path.is_file() and path != docs_dir / MANIFEST_FILE.name:
+                manifest[relative_path] = _file_hash(path)
+
+    return dict(sorted(manifest.items()))
+
+
+def load_manifest(docs_dir: Path = DOCS_DIR) -> ManifestType:
+    manifest_file = docs_dir / MANIFEST_FILE.name
+    if not manifest_file.exists():
+        return {}
+    return json.loads(manifest_file.read_text())
+
+
+def dump_manifest(manifest: ManifestType) -> str:
+    return json.dumps(manifest, indent=1, sort_keys=True) + '\n'
+
+
+def compare_manifests(previous: ManifestType, current: ManifestType) -> ManifestChanges:
+    return ManifestChanges(added=sorted(current.keys() - previous.keys()),
+                           changed=sorted(path for path in current.keys() & previous.keys()
+                                          if current[path] != previous[path]),
+                           removed=sorted(previous.keys() - current.keys()))
+
+
+def find_orphans(built_paths: Set[Path], docs_dir: Path = DOCS_DIR) -> List[Path]:
+    """Paths of the articles dir the build hasn't produced, and the dangling symlinks of the whole docs"""
+    orphans = []
+    built_parents = {parent for path in built_paths for parent in path.parents}
+    for dir_path, dir_names, file_names in os.walk(docs_dir / DOCS_ARTICLES_DIR.name):
+        dir_path = Path(dir_path)
+        for name in dir_names + file_names:
+            path = dir_path / name
+            if path in built_paths or (path in built_parents and not path.is_symlink()):
+                continue
+            orphans.append(path)
+
+        dir_names[:] = [name for name in dir_names if dir_path / name not in orphans]
+
+    for dir_path, dir_names, file_names in os.walk(docs_dir):
+        for name in dir_names + file_names:
+            path = Path(dir_path) / name
+            if path.is_symlink() and not path.exists() and path not in orphans:
+                orphans.append(path)
+
+    return sorted(orphans)
+
+
+def prune(orphans: List[Path]):
+    for path in orphans:
+        if path.is_symlink() or path.is_file():
+            path.unlink(missing_ok=True)
+        elif path.is_dir():
+            shutil.rmtree(path)
@@ -0,0 +1,53 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Iterable, List
+from urllib.parse import urljoin, urlsplit
+
+from constants import SITE_ADDRESS, PREFETCH_INDEX_COUNT
+
+
+@dataclass
+class PageNode:
+    link: str  # absolute path with a trailing slash
+    created_date: datetime
+    size: int  # estimated bytes of a page
+    hrefs: List[str] = field(default_factory=list)
+
+
+class LinkGraph:
+    """The most likely next pages: the newest articles after the index,
+    related articles and date neighbours after an article"""
+
+    def __init__(self, pages: Iterable[PageNode], bytes_budget: int):
+        self.pages = sorted(pages, key=lambda page: page.created_date, reverse=True)
+        self.bytes_budget = bytes_budget
+        self._sizes = {page.link: page.size for page in self.pages}
+
+    def _normalize(self, page: PageNode, href: str) -> str:
+        if href.startswith(SITE_ADDRESS):
+            href = href[len(SITE_ADDRESS):]
+        path = urlsplit(urljoin(page.link, href)).path
+        return path if path.endswith('/') else path + '/'
+
+    def _related(self, page: PageNode) -> List[str]:
+        links = (self._normalize(page, href) for href in page.hrefs)
+        return [link for link in links if link in self._sizes]
+
+    def _within_budget(self, links: Iterable[str]) -> List[str]:
+        hints, total_size = [], 0
+        for link in dict.fromkeys(links):  # ordered unique
+            total_size += self._sizes[link]
+            if total_size > self.bytes_budget:
+                break
+            hints.append(link)
+        return hints
+
+    def index_hints(self) -> List[str]:
+        return self._within_budget(page.link for page in self.pages[:PREFETCH_INDEX_COUNT])
+
+    def article_hints(self, created_date: datetime) -> List[str]:
+        idx = next(i for i, page in enumerate(self.pages) if page.created_date == created_date)
+        page, links = self.pages[idx], [page.link for page in self.pages]
+        neighbours = links[max(idx - 1, 0):idx] + links[idx + 1:idx + 2]  # newer, older
+        candidates = [link for link in self._related(page) + neighbours if link != page.link]
+        return self._within_budget(candidates)
@@ -0,0 +1,83 @@
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from constants import MEMORY_REPORT_TOP_COUNT
+
+
+IGNORED_TRACES = (tracemalloc.Filter(False, tracemalloc.__file__),
+                  tracemalloc.Filter(False, __file__),  # the stored snapshots and stats
+                  tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+                  tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+                  tracemalloc.Filter(False, '<unknown>'))
+
+
+@dataclass
+class StageMemory:
+    name: str
+    current: int  # bytes, traced at the stage end
+    peak: int  # bytes
+    top_stats: List[tracemalloc.StatisticDiff] = field(default_factory=list)
+
+
+class MemoryReport:
+    """Peak memory and top allocation sites of the build stages, durations are measured always.
+    The tracing starts once, a snapshot is taken at every stage boundary, the end one of a stage
+    is the start one of the next, the code between the stages is counted by the next stage."""
+
+    def __init__(self, is_enabled=False, top_count=MEMORY_REPORT_TOP_COUNT):
+        self.is_enabled = is_enabled
+        self.top_count = top_count
+        self.stages: List[StageMemory] = []
+        self.durations: Dict[str, float] = defaultdict(float)  # seconds, a repeated stage is summed up
+        self.snapshot: Optional[tracemalloc.Snapshot] = None  # of the last stage boundary
+
+    @contextmanager
+    def stage(self, name: str, variant: str = ''):
+        """A stage of a variant, but the first one, is named after the variant"""
+        name = f'{variant}: {name}' if variant else name
+        start = time.perf_counter()
+        try:
+            with self._trace(name):
+                yield
+        finally:
+            self.durations[name] += time.perf_counter() - start
+
+    def _take_snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(IGNORED_TRACES)
+
+    @contextmanager
+    def _trace(self, name: str):
+        if not self.is_enabled:
+            yield
+            return
+
+        if self.snapshot is None:
+            tracemalloc.start()
+            self.snapshot = self._take_snapshot()
+
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = self._take_snapshot()
+            top_stats = snapshot.compare_to(self.snapshot, 'lineno')[:self.top_count]
+            self.stages.append(StageMemory(name=name, current=current, peak=peak, top_stats=top_stats))
+            self.snapshot = snapshot
+
+    def print(self):
+        if not self.is_enabled or self.snapshot is None:
+            return
+
+        for stage in self.stages:
+            print(f'Stage: {stage.name}, peak: {stage.peak / 1024 / 1024:.1f} MiB, '
+                  f'retained: {stage.current / 1024 / 1024:.1f} MiB')
+            for stat in stage.top_stats:
+                print('   ', stat)
+
+        tracemalloc.stop()
+        self.snapshot = None
@@ -0,0 +1,34 @@
+from fnmatch import fnmatch
+from pathlib import PurePosixPath
+from typing import Iterable, List, Tuple
+
+from constants import DOCS_INDEX_FILE, SERVICE_WORKER_PRECACHE
+from manifest import ManifestType
+
+
+PrecacheType = List[Tuple[str, str]]  # url, content hash
+
+
+def _to_url(path: str) -> str:
+    if PurePosixPath(path).name == DOCS_INDEX_FILE.name:
+        return '/' + path[:-len(DOCS_INDEX_FILE.name)]
+    return '/' + path
+
+
+def precache_entries(manifest: ManifestType, links: Iterable[str] = ()) -> PrecacheType:
+    """App shell files by the patterns and links, articles under the human-readable symlinks"""
+    entries = {}
+    for path, content_hash in manifest.items():
+        if content_hash.startswith('symlink:'):
+            index_path = (PurePosixPath(path).parent / content_hash[len('symlink:'):] / DOCS_INDEX_FILE.name).as_posix()
+            if fnmatch(index_path, 'articles/*/index.html') and index_path in manifest:
+                entries[_to_url(path) + '/'] = manifest[index_path]
+        elif any(fnmatch(path, pattern) for pattern in SERVICE_WORKER_PRECACHE):
+            entries[_to_url(path)] = content_hash
+
+    for link in links:
+        path = link.lstrip('/')
+        if path in manifest:
+            entries[link] = manifest[path]
+
+    return sorted(entries.items())
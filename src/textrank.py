@@ -0,0 +1,75 @@
+import re
+import math
+from collections import Counter
+from typing import Dict, Hashable, List
+
+import numpy as np
+
+from constants import TEXTRANK_DAMPING, TEXTRANK_TOLERANCE, TEXTRANK_MAX_ITERATIONS, TEXTRANK_MIN_SENTENCE_WORDS
+
+
+# a sentence ends before a capital letter or a digit of the both alphabets
+SENTENCE_END_RE = re.compile(r'(?<=[.!?…])\s+(?=[A-ZА-ЯЁ0-9«"(])')
+WORD_RE = re.compile(r'[^\W\d_]{2,}')
+
+
+def split_sentences(text: str) -> List[str]:
+    sentences = []
+    for line in filter(str.strip, text.splitlines()):
+        sentences.extend(sentence.strip() for sentence in SENTENCE_END_RE.split(line.strip()))
+    return [sentence for sentence in sentences if len(WORD_RE.findall(sentence)) >= TEXTRANK_MIN_SENTENCE_WORDS]
+
+
+def tokenize(sentence: str) -> List[str]:
+    return WORD_RE.findall(sentence.lower())
+
+
+def rank(similarity: np.ndarray) -> np.ndarray:
+    """PageRank by the power iteration over the sentences similarity graph"""
+    size = len(similarity)
+    out_weights = similarity.sum(axis=1, keepdims=True)
+    transition = np.divide(similarity, out_weights, out=np.full_like(similarity, 1 / size), where=out_weights > 0)
+    scores = np.full(size, 1 / size)
+    for _ in range(TEXTRANK_MAX_ITERATIONS):
+        updated = (1 - TEXTRANK_DAMPING) / size + TEXTRANK_DAMPING * (transition.T @ scores)
+        if np.abs(updated - scores).sum() < TEXTRANK_TOLERANCE:
+            return updated
+        scores = updated
+    return scores
+
+
+def summarize_corpus(articles: Dict[Hashable, List[str]], sentences_count: int) -> Dict[Hashable, str]:
+    """TextRank summary of every article, text chunks of an article are joined.
+    Inverse document frequencies are computed over the sentences of the whole corpus."""
+
+    articles_sentences = {key: split_sentences('\n'.join(chunks)) for key, chunks in articles.items()}
+    articles_tokens = {key: [tokenize(sentence) for sentence in sentences]
+                       for key, sentences in articles_sentences.items()}
+
+    document_frequency = Counter(token for tokens_list in articles_tokens.values()
+                                 for tokens in tokens_list for token in set(tokens))
+    documents_count = sum(map(len, articles_tokens.values()))
+    idf = {token: math.log(documents_count / frequency) + 1 for token, frequency in document_frequency.items()}
+
+    summaries = {}
+    for key, sentences in articles_sentences.items():
+        tokens_list = articles_tokens[key]
+        if len(sentences) <= sentences_count:
+            summaries[key] = ' '.join(sentences)
+            continue
+
+        vocabulary = {token: i for i, token in enumerate(sorted({t for tokens in tokens_list for t in tokens}))}
+        tfidf = np.zeros((len(sentences), len(vocabulary)))
+        for row, tokens in enumerate(tokens_list):
+            for token, count in Counter(tokens).items():
+                tfidf[row, vocabulary[token]] = count * idf[token]
+
+        norms = np.linalg.norm(tfidf, axis=1, keepdims=True)
+        tfidf = np.divide(tfidf, norms, out=np.zeros_like(tfidf), where=norms > 0)
+        similarity = tfidf @ tfidf.T  # cosine
+        np.fill_diagonal(similarity, 0)
+
+        top = np.sort(np.argsort(-rank(similarity), kind='stable')[:sentences_count])  # in the text order
+        summaries[key] = ' '.join(sentences[i] for i in top)
+
+    return summaries
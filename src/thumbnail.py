@@ -1,3 +1,5 @@
+from io import BytesIO
+
 from PIL import Image
 from diskcache import Cache
 
@@ -8,12 +10,12 @@ cache = Cache(DISK_CACHE_DIR)
 
 
 @cache.memoize()
-def create_thumbnail(source_image_path, thumbnail_path):
+def create_thumbnail(source_image_path) -> bytes:
     im = Image.open(source_image_path)
     copied = im.copy()
     is_cover = False if source_image_path.name != ARTICLE_IMG_FILE else True
     size = (128, 128) if not is_cover else (256, 256)
     copied.thumbnail(size, Image.LANCZOS)
-    thumbnail_path.parent.mkdir(parents=True, exist_ok=True)
-    copied.save(thumbnail_path, quality=95)
-
+    buffer = BytesIO()
+    copied.save(buffer, format=im.format, quality=95)
+    return buffer.getvalue()
@@ -7,6 +7,8 @@ from datetime import datetime
 
 import markdown_it
 
+from constants import PARSER_RENDER_CACHE_SIZE
+
 
 def make_header_id(tag_text):
     return tag_text.lower().replace(' ', '-')
@@ -33,12 +35,10 @@ def slugify(title):
     return value
 
 
-@lru_cache
 def first_h1_text(element):
     return element.find('.//h1').text
 
 
-@lru_cache
 def first_p_text(element):
     """0th element has to be an article image"""
     return list(islice(element.iterfind('.//p'), 2))[1].text_content()
@@ -58,9 +58,22 @@ def replace_relative_with_dots(path: Path, dots_to) -> Path:
     return dot_path
 
 
-@lru_cache
-def parser_render(md_file: Path) -> str:
+def write_if_changed(path: Path, text: str) -> bool:
+    """An unchanged file keeps its mtime, deploys don't see it"""
+    if path.exists() and path.read_text() == text:
+        return False
+
+    path.write_text(text)
+    return True
+
+
+@lru_cache(maxsize=PARSER_RENDER_CACHE_SIZE)
+def parser_render(md_file: Path, math: bool = False) -> str:
+    """`$inline$` and `$$block$$` formulas are parsed with `math`"""
     parser = markdown_it.MarkdownIt().enable('table')
+    if math:
+        from mdit_py_plugins.dollarmath import dollarmath_plugin  # optional, only the math articles need it
+        parser.use(dollarmath_plugin, allow_space=False, allow_digits=False)
     md_text = Path(md_file).read_text()
     html = parser.render(md_text)
     return html
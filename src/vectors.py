@@ -0,0 +1,177 @@
+import json
+import hashlib
+from abc import ABC, abstractmethod
+from io import BytesIO
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Type, Union
+
+import numpy as np
+from diskcache import Cache
+
+from constants import (DISK_CACHE_DIR, VECTORS_DIR, VECTORS_EMBEDDER, VECTORS_DIM,
+                       VECTORS_CHUNK_TOKENS, VECTORS_IVF_MIN_COUNT, VECTORS_IVF_ITERATIONS, VECTORS_IVF_PROBES)
+from chunking import plan_chunks
+from context import BuildContext
+from textrank import tokenize
+
+
+VECTORS_FILE = 'vectors.npy'
+CENTROIDS_FILE = 'centroids.npy'
+TABLE_FILE = 'table.json'
+
+cache = Cache(DISK_CACHE_DIR)
+
+
+class Embedder(ABC):
+    """Texts to L2 normalized float32 rows. A name and a dim are a part of the cache keys."""
+    name = ''
+
+    def __init__(self, dim: int = VECTORS_DIM):
+        self.dim = dim
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> np.ndarray:
+        ...
+
+
+class HashingEmbedder(Embedder):
+    """Offline stand-in: words and word bigrams are hashed into the dim buckets with a sign,
+    sublinear term frequencies. Stateless, so a chunk vector doesn't depend on the rest of the corpus."""
+    name = 'hashing'
+
+    def _features(self, text: str) -> List[str]:
+        words = tokenize(text)
+        return words + [f'{first} {second}' for first, second in zip(words, words[1:])]
+
+    def embed(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'little')
+                matrix[row, digest % self.dim] += 1 if digest >> 63 else -1
+
+        np.copysign(np.log1p(np.abs(matrix)), matrix, out=matrix)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return np.divide(matrix, norms, out=matrix, where=norms > 0)
+
+
+EMBEDDERS: Dict[str, Type[Embedder]] = {HashingEmbedder.name: HashingEmbedder}  # register others by name
+
+
+@dataclass
+class Chunk:
+    article_id: str
+    title: str  # of a section
+    link: str
+    text: str
+
+    @property
+    def key(self) -> str:
+        return hashlib.sha1(self.text.encode()).hexdigest()
+
+
+def make_chunks(articles_exports: List[dict]) -> List[Chunk]:
+    """Sections of the exported articles, oversized ones are split to fit the budget"""
+    return [Chunk(article_id=article['id'], title=section['title'] or article['title'].strip(), link=article['link'],
+                  text=text)
+            for article in articles_exports
+            for section in article['sections']
+            for text in plan_chunks([section['text']], VECTORS_CHUNK_TOKENS).chunks if text.strip()]
+
+
+def embed_chunks(chunks: List[Chunk], embedder: Embedder) -> np.ndarray:
+    """Cached by a chunk text, only the chunks of the changed articles are embedded"""
+    keys = [f'vector-{embedder.name}-{embedder.dim}-{chunk.key}' for chunk in chunks]
+    vectors = [cache.get(key) for key in keys]
+    misses = [i for i, vector in enumerate(vectors) if vector is None]
+    if misses:
+        for i, vector in zip(misses, embedder.embed([chunks[i].text for i in misses])):
+            cache.set(keys[i], vector)
+            vectors[i] = vector
+        print(f'Vectors: {len(misses)} of {len(chunks)} chunks embedded')
+
+    return np.array(vectors, dtype=np.float32).reshape(len(chunks), embedder.dim)
+
+
+def kmeans(vectors: np.ndarray, count: int, iterations: int = VECTORS_IVF_ITERATIONS) -> Tuple[np.ndarray, np.ndarray]:
+    """Spherical k-means, centroids and a list of every vector. Seeded, a build is reproducible."""
+    rng = np.random.default_rng(0)
+    centroids = vectors[rng.choice(len(vectors), count, replace=False)]
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids).astype(np.float32)
+    return centroids, np.argmax(vectors @ centroids.T, axis=1)
+
+
+def _to_npy(array: np.ndarray) -> bytes:
+    buffer = BytesIO()
+    np.save(buffer, array, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def export_vectors(ctx: BuildContext, articles_exports: List[dict], embedder: Optional[Embedder] = None):
+    """The vectors matrix, with an IVF the rows of a list are contiguous, and the ID table of the rows"""
+    embedder = embedder or EMBEDDERS[VECTORS_EMBEDDER]()
+    chunks = make_chunks(articles_exports)
+    vectors = embed_chunks(chunks, embedder)
+
+    offsets = None
+    if len(chunks) >= VECTORS_IVF_MIN_COUNT:
+        centroids, assignment = kmeans(vectors, count=int(np.sqrt(len(chunks))))
+        order = np.argsort(assignment, kind='stable')
+        chunks, vectors = [chunks[i] for i in order], vectors[order]
+        offsets = np.searchsorted(assignment[order], np.arange(len(centroids) + 1)).tolist()
+        ctx.writer.write_bytes(ctx.path(VECTORS_DIR) / CENTROIDS_FILE, _to_npy(centroids))
+    else:
+        ctx.writer.remove([ctx.path(VECTORS_DIR) / CENTROIDS_FILE])
+
+    table = {'embedder': embedder.name, 'dim': embedder.dim, 'offsets': offsets,
+             'chunks': [{'article_id': chunk.article_id, 'title': chunk.title, 'link': chunk.link, 'text': chunk.text}
+                        for chunk in chunks]}
+    ctx.writer.write_bytes(ctx.path(VECTORS_DIR) / VECTORS_FILE, _to_npy(vectors))
+    ctx.writer.write_text(ctx.path(VECTORS_DIR) / TABLE_FILE, json.dumps(table, ensure_ascii=False, indent=1) + '\n')
+
+
+class VectorIndex:
+    """Nearest chunks by the cosine similarity. The matrix is memory mapped,
+    an IVF index scans the `probes` lists of the nearest centroids, a small one is scanned whole."""
+
+    def __init__(self, vectors: np.ndarray, table: dict, centroids: Optional[np.ndarray] = None):
+        self.vectors = vectors
+        self.table = table
+        self.centroids = centroids
+        self.embedder = EMBEDDERS[table['embedder']](table['dim'])
+
+    @classmethod
+    def load(cls, vectors_dir: Path = VECTORS_DIR) -> 'VectorIndex':
+        centroids_file = vectors_dir / CENTROIDS_FILE
+        return cls(vectors=np.load(vectors_dir / VECTORS_FILE, mmap_mode='r'),
+                   table=json.loads((vectors_dir / TABLE_FILE).read_text()),
+                   centroids=np.load(centroids_file) if centroids_file.exists() else None)
+
+    def _scores(self, query: np.ndarray, probes: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows and their scores, the rows of a list are a slice of the matrix"""
+        if self.centroids is None:
+            return np.arange(len(self.vectors)), self.vectors @ query
+
+        offsets = self.table['offsets']
+        nearest_lists = np.argsort(self.centroids @ query)[::-1][:probes]
+        rows = np.concatenate([np.arange(offsets[i], offsets[i + 1]) for i in nearest_lists])
+        scores = np.concatenate([self.vectors[offsets[i]:offsets[i + 1]] @ query for i in nearest_lists])
+        return rows, scores
+
+    def search(self, query: Union[str, np.ndarray], k: int = 5,
+               probes: int = VECTORS_IVF_PROBES) -> List[Tuple[dict, float]]:
+        """Chunks of the ID table with their scores, the best first"""
+        if isinstance(query, str):
+            query = self.embedder.embed([query])[0]
+
+        rows, scores = self._scores(np.asarray(query, dtype=np.float32), probes)
+        k = min(k, len(rows))
+        best = np.argpartition(-scores, k - 1)[:k] if k else []
+        best = sorted(best, key=lambda i: -scores[i])
+        return [(self.table['chunks'][rows[i]], float(scores[i])) for i in best]
@@ -0,0 +1,224 @@
+import os
+import json
+import shutil
+import hashlib
+from abc import ABC, abstractmethod
+from contextlib import suppress
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Union
+
+from constants import DOCS_ARTICLES_DIR, MANIFEST_FILE
+from manifest import ManifestType, scan_docs, load_manifest, find_orphans, prune
+from utils import write_if_changed
+
+
+@dataclass(frozen=True)
+class Symlink:
+    target: str
+
+
+SiteType = Dict[str, Union[bytes, Symlink]]  # relative path: content or symlink
+
+
+class Writer(ABC):
+    """Output layer of a build. Paths are absolute paths under an output root, as the disk ones."""
+
+    @abstractmethod
+    def write_text(self, path: Path, text: str) -> bool:
+        ...
+
+    @abstractmethod
+    def write_bytes(self, path: Path, content: bytes) -> bool:
+        ...
+
+    @abstractmethod
+    def link(self, source_path: Path, path: Path):
+        """An attached file of an article, the source file is outside of the output"""
+        ...
+
+    @abstractmethod
+    def symlink(self, target: str, path: Path):
+        ...
+
+    @abstractmethod
+    def copy_tree(self, source_dir: Path, dir_path: Path):
+        ...
+
+    @abstractmethod
+    def exists(self, path: Path) -> bool:
+        ...
+
+    @abstractmethod
+    def size(self, path: Path) -> Optional[int]:
+        ...
+
+    @abstractmethod
+    def read_text(self, path: Path) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def iterdir(self, dir_path: Path) -> List[Path]:
+        ...
+
+    @abstractmethod
+    def remove(self, paths: List[Path]):
+        ...
+
+    @abstractmethod
+    def scan(self, docs_dir: Path) -> ManifestType:
+        ...
+
+    @abstractmethod
+    def load_manifest(self, docs_dir: Path) -> ManifestType:
+        ...
+
+    @abstractmethod
+    def find_orphans(self, built_paths: Set[Path], docs_dir: Path) -> List[Path]:
+        ...
+
+
+class DiskWriter(Writer):
+    """Unchanged files keep their mtime, existing links are left as is"""
+
+    def write_text(self, path, text):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return write_if_changed(path, text)
+
+    def write_bytes(self, path, content):
+        if path.exists() and path.read_bytes() == content:
+            return False
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.unlink(missing_ok=True)  # may be a hardlink to a source file
+        path.write_bytes(content)
+        return True
+
+    def link(self, source_path, path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists() and not path.samefile(source_path):  # an optimized copy of the previous build
+            path.unlink()
+        with suppress(FileExistsError):
+            os.link(source_path, path)
+
+    def symlink(self, target, path):
+        if not path.is_symlink():
+            os.symlink(target, path, target_is_directory=True)
+
+    def copy_tree(self, source_dir, dir_path):
+        if source_dir != dir_path:
+            shutil.copytree(source_dir, dir_path, symlinks=True, dirs_exist_ok=True)
+
+    def exists(self, path):
+        return path.exists()
+
+    def size(self, path):
+        return path.stat().st_size if path.exists() else None
+
+    def read_text(self, path):
+        return path.read_text() if path.exists() else None
+
+    def iterdir(self, dir_path):
+        return list(dir_path.iterdir()) if dir_path.exists() else []
+
+    def remove(self, paths):
+        prune(paths)
+
+    def scan(self, docs_dir):
+        return scan_docs(docs_dir)
+
+    def load_manifest(self, docs_dir):
+        return load_manifest(docs_dir)
+
+    def find_orphans(self, built_paths, docs_dir):
+        return find_orphans(built_paths, docs_dir)
+
+
+@dataclass
+class MemoryWriter(Writer):
+    """Nothing is written to the disk, the sources are only read. A build result is taken by `site()`."""
+    files: Dict[Path, bytes] = field(default_factory=dict)
+    symlinks: Dict[Path, str] = field(default_factory=dict)
+
+    def write_text(self, path, text):
+        return self.write_bytes(path, text.encode())
+
+    def write_bytes(self, path, content):
+        if self.files.get(path) == content:
+            return False
+
+        self.files[path] = content
+        return True
+
+    def link(self, source_path, path):
+        self.files.setdefault(path, source_path.read_bytes())
+
+    def symlink(self, target, path):
+        self.symlinks.setdefault(path, target)
+
+    def copy_tree(self, source_dir, dir_path):
+        """Files of the disk tree overlaid by the written ones"""
+        for dir_name, _, file_names in os.walk(source_dir):
+            for name in file_names:
+                source_path = Path(dir_name) / name
+                self.files.setdefault(dir_path / source_path.relative_to(source_dir), source_path.read_bytes())
+
+        for path, content in list(self.files.items()):
+            if path.is_relative_to(source_dir) and source_dir != dir_path:
+                self.files[dir_path / path.relative_to(source_dir)] = content
+
+    def exists(self, path):
+        return path in self.files or path in self.symlinks
+
+    def size(self, path):
+        return len(self.files[path]) if path in self.files else None
+
+    def read_text(self, path):
+        return self.files[path].decode() if path in self.files else None
+
+    def iterdir(self, dir_path):
+        return [path for path in self._paths() if path.parent == dir_path]
+
+    def remove(self, paths):
+        for path in paths:
+            for stored_path in self._paths():
+                if stored_path == path or stored_path.is_relative_to(path):
+                    self.files.pop(stored_path, None)
+                    self.symlinks.pop(stored_path, None)
+
+    def scan(self, docs_dir):
+        manifest = {}
+        for relative_path, content in self.site(docs_dir).items():
+            if isinstance(content, Symlink):
+                manifest[relative_path] = 'symlink:' + content.target
+            elif relative_path != MANIFEST_FILE.name:
+                manifest[relative_path] = hashlib.sha1(content).hexdigest()
+
+        return manifest
+
+    def load_manifest(self, docs_dir):
+        text = self.read_text(docs_dir / MANIFEST_FILE.name)
+        return json.loads(text) if text else {}
+
+    def find_orphans(self, built_paths, docs_dir):
+        """Files of the previous builds into the same writer, and the dangling symlinks of the whole docs"""
+        articles_dir = docs_dir / DOCS_ARTICLES_DIR.name
+        orphans = {path for path in self._paths() if path.is_relative_to(articles_dir) and path not in built_paths}
+        orphans.update(path for path, target in self.symlinks.items()
+                       if path.is_relative_to(docs_dir) and not self._is_stored(path.parent / target))
+        return sorted(orphans)
+
+    def site(self, docs_dir: Path) -> SiteType:
+        site = {path.relative_to(docs_dir).as_posix(): content
+                for path, content in self.files.items() if path.is_relative_to(docs_dir)}
+        site.update((path.relative_to(docs_dir).as_posix(), Symlink(target))
+                    for path, target in self.symlinks.items() if path.is_relative_to(docs_dir))
+        return dict(sorted(site.items()))
+
+    def _paths(self) -> List[Path]:
+        return list(self.files) + list(self.symlinks)
+
+    def _is_stored(self, path: Path) -> bool:
+        """A file, a symlink or a dir of them, as the disk `exists()`"""
+        path = Path(os.path.normpath(path))
+        return self.exists(path) or any(stored_path.is_relative_to(path) for stored_path in self._paths())